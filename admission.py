@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, Dict, Hashable, NamedTuple, Optional
+from telemetry import ADMISSION
+
+# Controle de admissão: recusa ou rebaixa perguntas que não terminariam a tempo
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "on")
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "45"))  # Prazo (s) para a resposta começar a chegar ao usuário
+SUPERSEDE_REQUESTS = os.getenv("SUPERSEDE_REQUESTS", "true").lower() in ("1", "true", "on")  # Nova pergunta cancela a anterior do mesmo usuário
+INTERACTION_TTL = 15 * 60  # Validade do token de uma interação do Discord (s); depois disso não há como responder
+INTERACTION_MARGIN = 30  # Folga (s) antes do fim da validade, para enviar o aviso de erro
+
+
+class Decision(NamedTuple):
+    """Resultado da admissão de uma pergunta"""
+    action: str  # "run", "downgrade" ou "refuse"
+    model: str  # Modelo a chamar (no "refuse", o que foi avaliado)
+    estimate: Optional[float]  # Tempo estimado (s) até a resposta com esse modelo (None sem amostras)
+
+
+def interaction_deadline(age: float, deadline: float = REQUEST_DEADLINE) -> float:
+    """Prazo (em time.monotonic()) de uma interação recebida há `age` segundos"""
+    return time.monotonic() + max(0.0, min(deadline, INTERACTION_TTL - INTERACTION_MARGIN - age))
+
+
+class AdmissionController:
+    """Estima o tempo até a resposta e decide se uma pergunta deve ser atendida
+
+    A espera na fila vem do estado atual do LLMScheduler (chamadas em
+    andamento e enfileiradas, pausas por Retry-After) e a duração de cada
+    chamada vem da mediana recente do ModelRouter. Se o modelo do canal não
+    responderia dentro do prazo, tenta o fallback saudável mais rápido; se
+    nenhum couber, a pergunta é recusada na hora em vez de ocupar a fila.
+    Modelos ainda sem amostras são admitidos (o prazo continua valendo).
+    """
+
+    def __init__(self, scheduler, router, enabled: bool = ADMISSION_CONTROL):
+        """Inicializa o controle de admissão
+
+        Args:
+            scheduler: LLMScheduler por onde passam as chamadas
+            router: ModelRouter com as latências e a saúde dos modelos
+            enabled: Se False, toda pergunta é admitida com o modelo do canal
+        """
+        self.scheduler = scheduler
+        self.router = router
+        self.enabled = enabled
+
+    def service_time(self, model: str, streaming: bool = False) -> Optional[float]:
+        """Mediana recente da duração de uma chamada (ou do primeiro trecho, no streaming), None sem amostras"""
+        stats = self.router.model_stats(model)
+        median = stats.percentile(50, streaming)
+        if median is None:
+            median = stats.percentile(50, not streaming)  # Melhor que nada enquanto só há amostras do outro modo
+        return median
+
+    def estimate(self, model: str, streaming: bool = False) -> Optional[float]:
+        """Tempo estimado (s) até a resposta de uma nova chamada a um modelo
+
+        Supõe que a fila anda uma vaga a cada `duração / limite` segundos, pelo
+        limite global e pelo do modelo, e soma a pausa por Retry-After.
+
+        Returns:
+            Segundos, ou None se o modelo ainda não tem amostras de latência
+        """
+        scheduler = self.scheduler
+        occupied = self.service_time(model)  # Uma vaga fica ocupada até a resposta completa
+        if occupied is None:
+            return None
+        wait = 0.0
+        queued = scheduler.queue_depth()
+        if queued or scheduler.in_flight >= scheduler.max_concurrency:
+            wait = (queued + 1) * occupied / scheduler.max_concurrency
+        queued_model = scheduler.queued_for(model)
+        if queued_model or scheduler.in_flight_for(model) >= scheduler.limit_for(model):
+            wait = max(wait, (queued_model + 1) * occupied / scheduler.limit_for(model))
+        return scheduler.blocked_for(model) + wait + self.service_time(model, streaming)
+
+    def decide(self, model: str, deadline: Optional[float], streaming: bool = False) -> Decision:
+        """Decide como atender uma pergunta
+
+        Args:
+            model: Modelo configurado no canal
+            deadline: Prazo em time.monotonic() (None: sem prazo)
+            streaming: Se a resposta será transmitida (o prazo vale para o primeiro trecho)
+
+        Returns:
+            Decision com a ação, o modelo a chamar e o tempo estimado
+        """
+        estimate = self.estimate(model, streaming)
+        if not self.enabled or deadline is None or estimate is None:
+            return self._count(Decision("run", model, estimate))
+        remaining = deadline - time.monotonic()
+        if estimate <= remaining:
+            return self._count(Decision("run", model, estimate))
+
+        options = [
+            (self.estimate(fallback, streaming), fallback) for fallback in self.router.fallbacks
+            if fallback != model and self.router.model_stats(fallback).available()
+        ]
+        options = [(estimate, fallback) for estimate, fallback in options if estimate is not None]
+        if options:
+            fastest, fallback = min(options)
+            if fastest <= remaining:
+                return self._count(Decision("downgrade", fallback, fastest))
+        return self._count(Decision("refuse", model, estimate))
+
+    @staticmethod
+    def _count(decision: Decision) -> Decision:
+        ADMISSION.inc(decision=decision.action)
+        return decision
+
+
+class Supersession:
+    """Cancela o pedido anterior de uma mesma chave quando chega um novo
+
+    Usado com a chave (canal, usuário, comando): quem repete a pergunta
+    enquanto a anterior ainda espera não dobra a fila, e a chamada ao
+    OpenRouter da anterior é cancelada junto com ela.
+    """
+
+    def __init__(self, enabled: bool = SUPERSEDE_REQUESTS):
+        self.enabled = enabled
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, coro: Awaitable) -> bool:
+        """Executa `coro` como o pedido mais recente da chave
+
+        Args:
+            key: Chave do pedido
+            coro: Corrotina que atende o pedido
+
+        Returns:
+            True se terminou; False se foi substituída por um pedido mais novo
+        """
+        if not self.enabled:
+            await coro
+            return True
+
+        previous = self._tasks.get(key)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            ADMISSION.inc(decision="superseded")
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+        try:
+            await asyncio.wait({task})
+        finally:
+            if not task.done():
+                task.cancel()  # Quem chamou foi cancelado
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if task.cancelled():
+            return False
+        task.result()  # Repassa exceções
+        return True
+
+    async def close(self):
+        """Cancela os pedidos em andamento (no desligamento)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
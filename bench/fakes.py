@@ -0,0 +1,86 @@
+import time
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List, Optional
+
+# Objetos que imitam o suficiente de discord.Interaction para chamar os comandos fora do Discord
+
+_ids = itertools.count(10**17)
+
+
+class FakeMessage:
+    """Mensagem enviada pelo bot (aceita edições, como no streaming)"""
+
+    def __init__(self, content: Optional[str] = None, embed=None):
+        self.id = next(_ids)
+        self.content = content
+        self.embed = embed
+        self.edits = 0
+
+    async def edit(self, **kwargs):
+        # Como no discord.py, só muda o que foi passado
+        self.content = kwargs.get("content", self.content)
+        self.embed = kwargs.get("embed", self.embed)
+        self.edits += 1
+        return self
+
+
+class FakeResponse:
+    """interaction.response: a primeira resposta (ou o defer) de uma interação"""
+
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, embed=None, ephemeral: bool = False, **kwargs):
+        self._done = True
+        self._interaction._record(FakeMessage(content, embed))
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    """interaction.followup: mensagens enviadas depois do defer"""
+
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, embed=None, wait: bool = False, **kwargs):
+        message = FakeMessage(content, embed)
+        self._interaction._record(message)
+        return message
+
+
+class FakeInteraction:
+    """Interação de slash command sintética
+
+    Registra o momento da primeira mensagem visível para medir a latência
+    percebida pelo usuário além da duração total do comando.
+    """
+
+    def __init__(self, channel_id: int, user_id: int, guild_id: Optional[int] = None):
+        self.id = next(_ids)
+        self.channel = SimpleNamespace(id=channel_id)
+        self.channel_id = channel_id
+        self.user = SimpleNamespace(id=user_id, display_name=f"user{user_id}", bot=False)
+        self.guild_id = guild_id
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.messages: List[FakeMessage] = []
+        self.created_at = datetime.now(timezone.utc)
+        self.first_message_at: Optional[float] = None
+
+    def _record(self, message: FakeMessage):
+        if self.first_message_at is None:
+            self.first_message_at = time.perf_counter()
+        self.messages.append(message)
+
+    @property
+    def text(self) -> str:
+        """Conteúdo de todas as mensagens enviadas, concatenado"""
+        return "".join(m.content or "" for m in self.messages)
@@ -0,0 +1,135 @@
+import time
+import asyncio
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from database import Database, DEFAULT_CHANNEL_SETTINGS
+
+
+class MemoryDatabase(Database):
+    """Database em memória para benchmarks sem Postgres
+
+    Implementa as mesmas operações usadas pelo bot com dicionários. Cada
+    operação pode esperar `latency` segundos para simular a ida e volta ao
+    banco. O cache de configurações e a sanitização vêm do Database real.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """Inicializa o banco em memória
+
+        Args:
+            latency: Espera (s) adicionada a cada operação
+        """
+        super().__init__()
+        self.latency = latency
+        self.settings: Dict[int, Dict] = {}
+        self.history: Dict[int, List[Tuple[int, Dict[str, str]]]] = {}
+        self.summaries: Dict[int, Tuple[Optional[str], int]] = {}
+        self.responses: Dict[str, Tuple[float, str]] = {}
+        self.usage: List[Tuple[int, int, str]] = []
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.state: Dict[str, str] = {}
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def setup(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def pool_stats(self) -> Dict[str, int]:
+        return {"size": 0, "idle": 0, "in_use": 0, "max": 0}
+
+    async def get_channel_settings(self, channel_id: int) -> Dict:
+        cached = self._settings_cache.get(channel_id)
+        if cached is not None:
+            return dict(cached)
+        await self._round_trip()
+        settings = dict(self.settings.get(channel_id, DEFAULT_CHANNEL_SETTINGS))
+        self._settings_cache.set(channel_id, settings)
+        return dict(settings)
+
+    async def save_channel_settings(self, channel_id: int, model: str, continuous_mode: bool, response_cache: Optional[bool] = None):
+        await self._round_trip()
+        current = self.settings.get(channel_id, DEFAULT_CHANNEL_SETTINGS)
+        settings = {
+            "model": model,
+            "continuous_mode": continuous_mode,
+            "response_cache": current["response_cache"] if response_cache is None else response_cache,
+        }
+        self.settings[channel_id] = settings
+        self._settings_cache.set(channel_id, dict(settings))
+
+    async def load_conversation(self, channel_id: int, limit: int = 100) -> Dict:
+        await self._round_trip()
+        settings = dict(self.settings.get(channel_id, DEFAULT_CHANNEL_SETTINGS))
+        self._settings_cache.set(channel_id, settings)
+        summary, upto_seq = self.summaries.get(channel_id, (None, 0))
+        turns = [t for t in self.history.get(channel_id, []) if t[0] > upto_seq][-limit:]
+        return {"settings": dict(settings), "summary": summary, "upto_seq": upto_seq, "turns": turns}
+
+    def _last_seq(self, channel_id: int) -> int:
+        turns = self.history.get(channel_id)
+        return max(turns[-1][0] if turns else 0, self.summaries.get(channel_id, (None, 0))[1])
+
+    async def persist_turn(self, channel_id: int, messages: List[Dict[str, str]], usage: List[Tuple[int, str]]) -> List[int]:
+        await self._round_trip()
+        seq = self._last_seq(channel_id)
+        turns = [(seq + i, m) for i, m in enumerate(messages, 1)]
+        self.history.setdefault(channel_id, []).extend(turns)
+        self.usage.extend((channel_id, user_id, command) for user_id, command in usage)
+        return [s for s, _ in turns]
+
+    async def get_history_turns(self, channel_id: int, limit: int = 15, after_seq: int = 0) -> List[Tuple[int, Dict[str, str]]]:
+        await self._round_trip()
+        return [t for t in self.history.get(channel_id, []) if t[0] > after_seq][-limit:]
+
+    async def clear_message_history(self, channel_id: int):
+        await self._round_trip()
+        self.summaries[channel_id] = (None, self._last_seq(channel_id))
+        self.history.pop(channel_id, None)
+
+    async def save_conversation_summary(self, channel_id: int, summary: str, upto_seq: int):
+        await self._round_trip()
+        if upto_seq > self.summaries.get(channel_id, (None, 0))[1]:
+            self.summaries[channel_id] = (summary, upto_seq)
+
+    async def get_cached_response(self, key: str) -> Optional[str]:
+        await self._round_trip()
+        item = self.responses.get(key)
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    async def save_cached_response(self, key: str, model: str, response: str, ttl: float):
+        await self._round_trip()
+        self.responses[key] = (time.monotonic() + ttl, response)
+
+    async def log_usage(self, channel_id: int, user_id: int, command: str):
+        self.usage.append((channel_id, user_id, command))
+
+    async def flush_usage(self):
+        pass
+
+    async def get_usage_stats(self, channel_id: int, days: int = 7) -> Dict:
+        await self._round_trip()
+        return dict(Counter(command for channel, _, command in self.usage if channel == channel_id))
+
+    async def take_rate_limit_token(self, key: str, capacity: int, window: float) -> bool:
+        await self._round_trip()
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - updated_at) * capacity / window)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+    async def get_bot_state(self, key: str) -> Optional[str]:
+        return self.state.get(key)
+
+    async def set_bot_state(self, key: str, value: str):
+        self.state[key] = value
@@ -0,0 +1,128 @@
+import json
+import random
+import asyncio
+from typing import Optional
+from aiohttp import web
+
+# Servidor local que imita o endpoint /chat/completions do OpenRouter, para benchmarks sem rede.
+# Uso isolado: python -m bench.mock_openrouter --port 8765 --latency 0.5
+
+
+class MockOpenRouter:
+    """Imitação do OpenRouter com latência, streaming e taxa de erros configuráveis"""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, first_token: float = 0.1, chunks: int = 20,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None):
+        """Inicializa o servidor
+
+        Args:
+            latency: Tempo médio (s) até a resposta completa
+            jitter: Variação aleatória (s) somada ou subtraída da latência
+            first_token: Tempo (s) até o primeiro trecho no streaming
+            chunks: Número de trechos de cada resposta
+            error_rate: Fração de requisições que respondem 500
+            rate_limit_rate: Fração de requisições que respondem 429
+            seed: Semente do gerador aleatório (para execuções reproduzíveis)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.first_token = first_token
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def _answer(body: dict) -> str:
+        question = body["messages"][-1]["content"] if body.get("messages") else ""
+        return f"Resposta simulada ({body.get('model')}) para: {question[:200]}"
+
+    @staticmethod
+    def _usage(body: dict, answer: str) -> dict:
+        prompt = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        completion = len(answer) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response({"error": {"message": "rate limited"}}, status=429, headers={"Retry-After": "1"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            await asyncio.sleep(self._delay() / 2)
+            return web.json_response({"error": {"message": "upstream error"}}, status=500)
+
+        answer = self._answer(body)
+        usage = self._usage(body, answer)
+        if not body.get("stream"):
+            await asyncio.sleep(self._delay())
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": answer}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.first_token)
+        step = max(1, len(answer) // self.chunks)
+        pause = max(0.0, self._delay() - self.first_token) / self.chunks
+        for i in range(0, len(answer), step):
+            event = {"choices": [{"delta": {"content": answer[i:i + step]}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            await asyncio.sleep(pause)
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Inicia o servidor e retorna a URL do endpoint (porta 0 escolhe uma livre)"""
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}/api/v1/chat/completions"
+        return self.url
+
+    async def stop(self):
+        """Encerra o servidor"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def _serve(args):
+    server = MockOpenRouter(args.latency, args.jitter, args.first_token, args.chunks, args.error_rate, args.rate_limit_rate)
+    url = await server.start(args.host, args.port)
+    print(f"Mock do OpenRouter em {url} (use OPENROUTER_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Servidor local que imita o OpenRouter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--first-token", type=float, default=0.1)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+from typing import Dict, List
+
+# Benchmark offline do bot: chama os handlers dos slash commands com interações sintéticas
+# contra um OpenRouter local simulado, sem Discord e sem rede.
+#
+#   python -m bench.run --scenario ask --concurrency 1,8,32 --requests 200
+#   python -m bench.run --backend postgres --scenario continuous   (usa DATABASE_URL)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeInteraction
+from bench.mock_openrouter import MockOpenRouter
+
+SCENARIOS = ("ask", "code", "continuous", "stats", "settings", "compare", "mixed")
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Percentil p (nearest-rank) de uma lista de amostras"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * p / 100 + 0.5)) - 1))]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark offline do Kurama Bot")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="ask")
+    parser.add_argument("--backend", choices=("memory", "postgres"), default="memory",
+                        help="memory: banco em processo; postgres: usa DATABASE_URL (crie um banco só para isso)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Níveis de concorrência, separados por vírgula")
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por nível de concorrência")
+    parser.add_argument("--channels", type=int, default=16, help="Canais distintos usados pelas requisições")
+    parser.add_argument("--repeat", type=float, default=0.0, help="Fração de perguntas repetidas (acertos de cache)")
+    parser.add_argument("--stream", action="store_true", help="Liga STREAM_RESPONSES")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latência média do OpenRouter simulado (s)")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--first-token", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Ida e volta simulada do banco em memória (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def configure_environment(args, url: str):
+    """Define as variáveis lidas pelos módulos do bot na importação"""
+    os.environ["OPENROUTER_URL"] = url
+    os.environ.setdefault("DISCORD_TOKEN", "bench")
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    os.environ["STREAM_RESPONSES"] = "true" if args.stream else "false"
+    os.environ["STREAM_EDIT_INTERVAL"] = os.environ.get("STREAM_EDIT_INTERVAL", "0.2")
+    os.environ.pop("METRICS_PORT", None)
+
+
+async def prepare_bot(args):
+    """Importa main.py sem iniciar o bot e troca o que depende do Discord ou do Postgres"""
+    import main
+    from ratelimit import MemoryRateLimitBackend, PostgresRateLimitBackend, RateLimiter
+
+    if args.backend == "memory":
+        from bench.memory_db import MemoryDatabase
+        main.db = MemoryDatabase(args.db_latency)
+        main.response_cache.db = main.db
+        if main.memoria_longa is not None:
+            main.memoria_longa.db = main.db
+    await main.db.setup()
+    await main.ai_client.start()
+
+    # Mantém o caminho do rate limit, mas sem que ele recuse as requisições do benchmark
+    backend = PostgresRateLimitBackend(main.db) if args.backend == "postgres" else MemoryRateLimitBackend()
+    main.rate_limiter = RateLimiter(backend, {"window": 1, "max_requests": 10**9})
+    return main
+
+
+async def prepare_channels(main, args, channels: List[int]):
+    """Ajusta as configurações dos canais conforme o cenário"""
+    continuous = args.scenario in ("continuous", "mixed")
+    for canal in channels:
+        await main.db.save_channel_settings(canal, None, continuous)
+
+
+def make_call(main, scenario: str, interaction: FakeInteraction, question: str):
+    """Corrotina que executa um comando do cenário"""
+    if scenario in ("ask", "continuous"):
+        return main.ask.callback(interaction, question)
+    if scenario == "code":
+        return main.code.callback(interaction, question)
+    if scenario == "stats":
+        return main.stats.callback(interaction)
+    if scenario == "settings":
+        return main.model.callback(interaction, None)
+    if scenario == "compare":
+        return main.compare.callback(interaction, question, None)
+    raise ValueError(scenario)
+
+
+async def run_level(main, args, concurrency: int, channels: List[int], run_id: int) -> Dict:
+    """Executa `args.requests` requisições com no máximo `concurrency` simultâneas"""
+    latencies, first_message, errors = [], [], 0
+    counter = itertools.count()
+    mixed = itertools.cycle(("ask", "ask", "code", "stats", "settings"))
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= args.requests:
+                return
+            scenario = next(mixed) if args.scenario == "mixed" else args.scenario
+            canal = channels[i % len(channels)]
+            repeated = args.repeat and (i % 100) < args.repeat * 100
+            question = f"Pergunta {i % 10 if repeated else f'{run_id}-{i}'}: explique o conceito número {i % 10}"
+            interaction = FakeInteraction(canal, user_id=1000 + i % 500, guild_id=canal % 4)
+            started = time.perf_counter()
+            try:
+                await make_call(main, scenario, interaction, question)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if interaction.first_message_at is not None:
+                first_message.append(interaction.first_message_at - started)
+            if any(erro in interaction.text for erro in main.ERROS) or "Desculpe" in interaction.text or "⏳" in interaction.text:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "first_p50": percentile(first_message, 50),
+    }
+
+
+def print_report(results: List[Dict], upstream: int):
+    print(f"{'conc':>5} {'reqs':>6} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'1ª msg p50':>11}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['requests']:>6} {r['errors']:>6} {r['rps']:>8.1f} "
+            f"{r['p50'] * 1000:>8.0f} {r['p95'] * 1000:>8.0f} {r['p99'] * 1000:>8.0f} {r['first_p50'] * 1000:>11.0f}"
+        )
+    print(f"Requisições ao OpenRouter simulado: {upstream}")
+
+
+def print_stages():
+    """Latência por etapa registrada pela telemetria durante o benchmark"""
+    from telemetry import STAGE_SECONDS
+    print("\nEtapas (p50 / p95 ms):")
+    for stage in STAGE_SECONDS.label_values("stage"):
+        p50 = STAGE_SECONDS.quantile(0.5, stage=stage)
+        p95 = STAGE_SECONDS.quantile(0.95, stage=stage)
+        print(f"  {stage:<18} {p50 * 1000:>8.2f} / {p95 * 1000:.2f} ({STAGE_SECONDS.count(stage=stage)})")
+
+
+async def check_history(main, channels: List[int]):
+    """Confere no Postgres o que o write-behind gravou: nenhum seq repetido, nada pendente e
+    mensagens guardadas como objetos JSON (não como strings com JSON dentro) que voltam como dicts"""
+    await main.db.flush_history()
+    async with main.db.pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT COUNT(*) AS total, COUNT(DISTINCT (channel_id, seq)) AS distintos, "
+            "COUNT(*) FILTER (WHERE jsonb_typeof(message_data) <> 'object') AS mal_codificadas "
+            "FROM message_history WHERE channel_id = ANY($1::BIGINT[])",
+            channels
+        )
+        sample = await conn.fetchval("SELECT message_data FROM message_history WHERE channel_id = ANY($1::BIGINT[]) LIMIT 1", channels)
+    pending = len(main.db._history_buffer)
+    print(f"\nHistórico no Postgres: {row['total']} mensagens, {row['total'] - row['distintos']} seqs repetidos, "
+          f"{pending} pendentes, {row['mal_codificadas']} mal codificadas")
+    if row['total'] != row['distintos'] or pending or row['mal_codificadas'] or not isinstance(sample, (dict, type(None))):
+        raise SystemExit("Histórico inconsistente")
+
+
+async def run(args):
+    mock = MockOpenRouter(args.latency, args.jitter, args.first_token, error_rate=args.error_rate,
+                          rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    url = await mock.start()
+    configure_environment(args, url)
+    main = await prepare_bot(args)
+
+    channels = [900_000 + c for c in range(args.channels)]
+    await prepare_channels(main, args, channels)
+
+    print(f"Cenário {args.scenario}, banco {args.backend}, streaming {'ligado' if args.stream else 'desligado'}, "
+          f"OpenRouter simulado com {args.latency * 1000:.0f} ms de latência")
+    results = []
+    try:
+        for run_id, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            results.append(await run_level(main, args, concurrency, channels, run_id))
+        print_report(results, mock.requests)
+        print_stages()
+        if args.backend == "postgres":
+            await check_history(main, channels)
+    finally:
+        for tarefa in list(main.tarefas_em_segundo_plano):
+            tarefa.cancel()
+        await main.ai_client.close()
+        await main.db.close()
+        await mock.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
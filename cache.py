@@ -0,0 +1,312 @@
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """Cache LRU em memória com tempo de expiração por entrada
+
+    Quando o cache está cheio, a entrada usada há mais tempo é descartada.
+    Entradas mais velhas que `ttl` segundos são tratadas como ausentes.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """Inicializa o cache
+
+        Args:
+            maxsize: Número máximo de entradas
+            ttl: Tempo de vida de cada entrada em segundos (None = sem expiração)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # {chave: (expira_em, valor)}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor de uma chave, ou `default` se ausente ou expirada"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Armazena um valor, descartando a entrada menos usada se necessário
+
+        Args:
+            key: Chave
+            value: Valor
+            ttl: Tempo de vida desta entrada (padrão: o do cache)
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove uma chave e retorna seu valor"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        """Remove todas as entradas"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ConversationCache:
+    """Conversas dos canais ativos em memória, em LRU limitado por bytes
+
+    Cada canal guarda o resumo, o upto_seq e as mensagens mais recentes
+    depois dele como tuplas (seq, papel, conteúdo), bem mais compactas que
+    os dicts decodificados do JSON. Canais com gravações ainda não enviadas
+    ao banco (write-behind) nunca são descartados, e enquanto houver
+    mensagens pendentes uma carga do banco (incompleta) não é aceita.
+    """
+
+    MESSAGE_OVERHEAD = 120  # Bytes aproximados de uma tupla de mensagem além do conteúdo
+
+    def __init__(self, max_bytes: int, max_turns: int):
+        """Inicializa o cache
+
+        Args:
+            max_bytes: Orçamento aproximado de memória de todas as conversas
+            max_turns: Mensagens mantidas por canal (as mais antigas saem)
+        """
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.bytes = 0
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._generations: Dict[int, int] = {}  # Muda a cada invalidação, para descartar cargas que ficaram velhas
+        self._dirty: Dict[int, int] = {}  # {canal: mensagens ainda não gravadas}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def _size(cls, summary: Optional[str], turns: List[Tuple[int, str, str]]) -> int:
+        return len(summary or "") + sum(len(content) + cls.MESSAGE_OVERHEAD for _, _, content in turns)
+
+    def generation(self, channel_id: int) -> int:
+        """Marca a ser passada para put() por quem vai carregar o canal do banco"""
+        return self._generations.get(channel_id, 0)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._entries
+
+    def get(self, channel_id: int, limit: int) -> Optional[Dict]:
+        """Resumo e últimas `limit` mensagens de um canal, se estiverem em memória
+
+        Returns:
+            Dicionário com "summary", "upto_seq" e "turns" ([(seq, mensagem), ...]), ou None
+        """
+        entry = self._entries.get(channel_id)
+        if entry is None or (entry["truncated"] and len(entry["turns"]) < limit):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(channel_id)
+        self.hits += 1
+        turns = entry["turns"][-limit:] if limit else []
+        return {
+            "summary": entry["summary"],
+            "upto_seq": entry["upto_seq"],
+            "turns": [(seq, {"role": role, "content": content}) for seq, role, content in turns],
+        }
+
+    def last_seq(self, channel_id: int) -> Optional[int]:
+        """Maior seq conhecido de um canal em memória (None se o canal não estiver em memória)"""
+        entry = self._entries.get(channel_id)
+        if entry is None:
+            return None
+        return entry["turns"][-1][0] if entry["turns"] else entry["upto_seq"]
+
+    def put(self, channel_id: int, summary: Optional[str], upto_seq: int, turns: List[Tuple[int, Dict[str, str]]],
+            truncated: bool, generation: int):
+        """Guarda um canal carregado do banco
+
+        Não faz nada se o canal já estiver em memória ou se foi invalidado
+        depois que a carga começou (generation diferente).
+
+        Args:
+            channel_id: ID do canal
+            summary: Resumo da conversa
+            upto_seq: seq da última mensagem incorporada ao resumo
+            turns: Mensagens depois do resumo, da mais antiga para a mais nova
+            truncated: Se o banco pode ter mensagens mais antigas que as carregadas
+            generation: Valor de generation() lido antes da carga
+        """
+        if channel_id in self._entries or channel_id in self._dirty or generation != self.generation(channel_id):
+            return
+        compact = [(seq, message.get("role", ""), message.get("content") or "") for seq, message in turns]
+        if len(compact) > self.max_turns:
+            compact, truncated = compact[-self.max_turns:], True
+        entry = {"summary": summary, "upto_seq": upto_seq, "turns": compact, "truncated": truncated,
+                 "size": self._size(summary, compact)}
+        self._entries[channel_id] = entry
+        self.bytes += entry["size"]
+        self._evict()
+
+    def append(self, channel_id: int, turns: List[Tuple[int, Dict[str, str]]], pending: bool = False):
+        """Acrescenta mensagens a um canal em memória
+
+        Args:
+            channel_id: ID do canal (precisa estar em memória)
+            turns: Mensagens novas como [(seq, mensagem), ...]
+            pending: Se ainda não foram gravadas no banco (o canal fica preso em memória até flushed())
+        """
+        entry = self._entries[channel_id]
+        self._entries.move_to_end(channel_id)
+        compact = [(seq, message.get("role", ""), message.get("content") or "") for seq, message in turns]
+        entry["turns"].extend(compact)
+        added = self._size(None, compact)
+        overflow = len(entry["turns"]) - self.max_turns
+        if overflow > 0:
+            added -= self._size(None, entry["turns"][:overflow])
+            del entry["turns"][:overflow]
+            entry["truncated"] = True
+        entry["size"] += added
+        self.bytes += added
+        if pending:
+            self._dirty[channel_id] = self._dirty.get(channel_id, 0) + len(turns)
+        self._evict()
+
+    def set_summary(self, channel_id: int, summary: Optional[str], upto_seq: int):
+        """Atualiza o resumo de um canal em memória, descartando as mensagens incorporadas a ele"""
+        entry = self._entries.get(channel_id)
+        if entry is None or upto_seq <= entry["upto_seq"]:
+            return
+        turns = [turn for turn in entry["turns"] if turn[0] > upto_seq]
+        size = self._size(summary, turns)
+        self.bytes += size - entry["size"]
+        entry.update(summary=summary, upto_seq=upto_seq, turns=turns, size=size)
+
+    def invalidate(self, channel_id: int):
+        """Descarta um canal (a próxima leitura vai ao banco)
+
+        As mensagens pendentes continuam contadas até flushed(): sem elas o
+        banco ainda não sabe os seqs já usados, e o canal não pode ser
+        recarregado nem numerado de novo.
+        """
+        self._generations[channel_id] = self.generation(channel_id) + 1
+        entry = self._entries.pop(channel_id, None)
+        if entry is not None:
+            self.bytes -= entry["size"]
+
+    def is_dirty(self, channel_id: int) -> bool:
+        return channel_id in self._dirty
+
+    def flushed(self, counts: Dict[int, int]):
+        """Registra que mensagens pendentes foram gravadas ({canal: quantidade})"""
+        for channel_id, count in counts.items():
+            remaining = self._dirty.get(channel_id, 0) - count
+            if remaining > 0:
+                self._dirty[channel_id] = remaining
+            else:
+                self._dirty.pop(channel_id, None)
+        self._evict()
+
+    def _evict(self):
+        if self.bytes <= self.max_bytes:
+            return
+        for channel_id in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if channel_id not in self._dirty:
+                self.bytes -= self._entries.pop(channel_id)["size"]
+
+    def channels(self) -> List[int]:
+        """Canais em memória, do menos para o mais recentemente usado"""
+        return list(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "channels": len(self._entries),
+            "bytes": self.bytes,
+            "dirty": len(self._dirty),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class ResponseCache:
+    """Cache de respostas do modelo em dois níveis: LRU em memória e tabela no Postgres
+
+    Usado apenas para perguntas sem histórico (modo contínuo desligado),
+    em que a requisição é sempre [system prompt, pergunta].
+    """
+
+    def __init__(self, db, maxsize: int = 1000, ttl: float = 86400):
+        """Inicializa o cache
+
+        Args:
+            db: Instância de Database (nível persistente)
+            maxsize: Número máximo de respostas em memória
+            ttl: Validade de cada resposta em segundos
+        """
+        self.db = db
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize, ttl)
+        self.hits = 0  # Acertos no nível em memória
+        self.db_hits = 0  # Acertos no Postgres
+        self.misses = 0
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Normaliza uma pergunta para que variações triviais caiam na mesma entrada"""
+        prompt = re.sub(r"\s+", " ", prompt.strip().lower())
+        return prompt.rstrip("?!. ")
+
+    @classmethod
+    def make_key(cls, model: str, system_prompt: str, prompt: str) -> str:
+        """Calcula a chave de uma pergunta
+
+        Args:
+            model: ID do modelo
+            system_prompt: Conteúdo do system prompt (persona)
+            prompt: Pergunta do usuário
+
+        Returns:
+            Hash SHA-256 em hexadecimal
+        """
+        raw = "\x00".join((model, system_prompt, cls.normalize(prompt)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Busca uma resposta, primeiro em memória e depois no Postgres"""
+        response = self._memory.get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        response = await self.db.get_cached_response(key)
+        if response is not None:
+            self.db_hits += 1
+            self._memory.set(key, response)
+            return response
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, model: str, response: str):
+        """Grava uma resposta nos dois níveis"""
+        self._memory.set(key, response)
+        await self.db.save_cached_response(key, model, response, self.ttl)
+
+    def stats(self) -> dict:
+        """Retorna os contadores de acerto e erro"""
+        total = self.hits + self.db_hits + self.misses
+        return {
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.db_hits) / total if total else 0.0,
+            "size": len(self._memory),
+        }
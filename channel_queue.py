@@ -0,0 +1,153 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class ChannelQueue:
+    """Fila de trabalho assíncrona por canal
+
+    Os itens de um mesmo canal são processados um de cada vez, na ordem de
+    chegada, enquanto canais diferentes rodam em paralelo. Se vários itens
+    se acumularem durante um processamento, os próximos com a mesma
+    `batch_key` podem ser entregues juntos ao handler (coalescência).
+    """
+
+    def __init__(self, handler: Callable[[int, List[Any]], Awaitable[Optional[List[Any]]]], coalesce: bool = True, max_batch: int = 5):
+        """Inicializa a fila
+
+        Args:
+            handler: Função async (channel_id, itens) que processa um lote e retorna um resultado por item (ou None)
+            coalesce: Se itens acumulados devem ser processados em lote
+            max_batch: Tamanho máximo de um lote
+        """
+        self.handler = handler
+        self.coalesce = coalesce
+        self.max_batch = max_batch
+        self._pending: Dict[int, List[tuple]] = {}  # {channel_id: [(item, batch_key, future), ...]}
+        self._workers: Dict[int, asyncio.Task] = {}  # Uma tarefa ativa por canal com itens pendentes
+
+    async def submit(self, channel_id: int, item: Any, batch_key: Hashable = None) -> Any:
+        """Enfileira um item e espera seu processamento
+
+        Args:
+            channel_id: ID do canal do Discord
+            item: Item a processar
+            batch_key: Só itens com a mesma chave são agrupados no mesmo lote
+
+        Returns:
+            Resultado do handler para este item
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(channel_id, []).append((item, batch_key, future))
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._run(channel_id))
+        return await future
+
+    def pending(self, channel_id: int) -> int:
+        """Número de itens aguardando processamento em um canal"""
+        return len(self._pending.get(channel_id, ()))
+
+    async def close(self):
+        """Cancela os itens pendentes e os lotes em processamento (no desligamento)"""
+        for queue in self._pending.values():
+            for _, _, future in queue:
+                future.cancel()
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def _next_batch(self, queue: List[tuple]) -> List[tuple]:
+        """Retira da fila o próximo lote: os primeiros itens consecutivos com a mesma batch_key"""
+        size = 1
+        if self.coalesce:
+            key = queue[0][1]
+            while size < min(len(queue), self.max_batch) and queue[size][1] == key:
+                size += 1
+        batch = queue[:size]
+        del queue[:size]
+        return batch
+
+    async def _run(self, channel_id: int):
+        """Processa os itens de um canal até a fila esvaziar"""
+        try:
+            queue = self._pending[channel_id]
+            while queue:
+                batch = self._next_batch(queue)
+                try:
+                    results = await self.handler(channel_id, [item for item, _, _ in batch])
+                except asyncio.CancelledError:
+                    for _, _, future in batch:
+                        future.cancel()
+                    raise
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for i, (_, _, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(results[i] if results else None)
+        finally:
+            self._pending.pop(channel_id, None)
+            self._workers.pop(channel_id, None)
+
+
+class Debouncer:
+    """Agrupa itens que chegam em rajada no mesmo canal
+
+    Cada item novo adia o disparo por `window` segundos; a rajada é entregue
+    ao handler quando o canal fica em silêncio, quando passam `max_wait`
+    segundos desde o primeiro item ou quando junta `max_items` itens.
+    """
+
+    def __init__(self, handler: Callable[[int, List[Any]], Awaitable], window: float = 2.0, max_wait: float = 8.0, max_items: int = 20):
+        """Inicializa o debouncer
+
+        Args:
+            handler: Função async (channel_id, itens) chamada com cada rajada
+            window: Segundos de silêncio que encerram uma rajada
+            max_wait: Espera máxima desde o primeiro item da rajada
+            max_items: Número de itens que dispara a rajada imediatamente
+        """
+        self.handler = handler
+        self.window = window
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._bursts: Dict[int, dict] = {}  # {channel_id: {"items": [...], "first_at": float, "timer": TimerHandle}}
+        self._tasks = set()  # Rajadas em processamento
+
+    def add(self, channel_id: int, item: Any):
+        """Acrescenta um item à rajada do canal e reagenda o disparo"""
+        loop = asyncio.get_running_loop()
+        burst = self._bursts.get(channel_id)
+        if burst is None:
+            burst = self._bursts[channel_id] = {"items": [], "first_at": loop.time(), "timer": None}
+        else:
+            burst["timer"].cancel()
+        burst["items"].append(item)
+
+        if len(burst["items"]) >= self.max_items:
+            self._fire(channel_id)
+            return
+        delay = max(0.0, min(self.window, burst["first_at"] + self.max_wait - loop.time()))
+        burst["timer"] = loop.call_later(delay, self._fire, channel_id)
+
+    def _fire(self, channel_id: int):
+        """Entrega a rajada acumulada de um canal ao handler"""
+        burst = self._bursts.pop(channel_id, None)
+        if burst is None:
+            return
+        task = asyncio.get_running_loop().create_task(self.handler(channel_id, burst["items"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Descarta as rajadas ainda não disparadas e cancela as em processamento (no desligamento)"""
+        for burst in self._bursts.values():
+            burst["timer"].cancel()
+        self._bursts.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
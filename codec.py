@@ -0,0 +1,93 @@
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Union
+
+# Serialização JSON dos caminhos quentes (corpo das requisições ao OpenRouter e colunas JSON/JSONB).
+# Usa o orjson se estiver instalado; sem ele, o json da biblioteca padrão com a mesma saída compacta.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONB_VERSION = b"\x01"  # Primeiro byte do formato binário do jsonb no Postgres
+
+
+def dumps(obj: Any) -> bytes:
+    """Codifica um objeto em JSON compacto (UTF-8)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodifica JSON de bytes ou str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _jsonb_encode(obj: Any) -> bytes:
+    return JSONB_VERSION + dumps(obj)
+
+
+def _jsonb_decode(data: bytes) -> Any:
+    return loads(data[1:])
+
+
+async def register_pg_codecs(conn):
+    """Registra codecs de json e jsonb numa conexão do asyncpg (use como `init` do pool)
+
+    Com eles, parâmetros dessas colunas recebem objetos Python e os valores
+    lidos já chegam decodificados, sem json.dumps/json.loads em volta de
+    cada consulta. O formato binário também serve ao copy_records_to_table.
+    """
+    await conn.set_type_codec("json", schema="pg_catalog", encoder=dumps, decoder=loads, format="binary")
+    await conn.set_type_codec("jsonb", schema="pg_catalog", encoder=_jsonb_encode, decoder=_jsonb_decode, format="binary")
+
+
+class ChatBodyEncoder:
+    """Monta o corpo JSON das requisições de chat reaproveitando mensagens já codificadas
+
+    O system prompt e os turnos do histórico se repetem em toda requisição
+    de um canal; cada mensagem é codificada uma única vez e guardada num
+    LRU, e o corpo é só a concatenação dos trechos prontos.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        """Inicializa o codificador
+
+        Args:
+            maxsize: Número máximo de mensagens codificadas mantidas
+        """
+        self.maxsize = maxsize
+        self._encoded: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    def message(self, message: Dict[str, str]) -> bytes:
+        """JSON de uma mensagem, do LRU quando ela já foi codificada antes"""
+        key = tuple(message.items())
+        encoded = self._encoded.get(key)
+        if encoded is not None:
+            self._encoded.move_to_end(key)
+            return encoded
+        encoded = dumps(message)
+        self._encoded[key] = encoded
+        if len(self._encoded) > self.maxsize:
+            self._encoded.popitem(last=False)
+        return encoded
+
+    def body(self, model: str, messages: List[Dict[str, str]], **extra: Any) -> bytes:
+        """Corpo de uma requisição /chat/completions
+
+        Args:
+            model: ID do modelo
+            messages: Mensagens da requisição
+            **extra: Outros campos do corpo (ex: stream=True)
+
+        Returns:
+            JSON em bytes, equivalente a dumps({"model": ..., "messages": ..., **extra})
+        """
+        parts = [b'{"model":', dumps(model), b',"messages":[', b",".join(self.message(m) for m in messages), b"]"]
+        for key, value in extra.items():
+            parts += (b",", dumps(key), b":", dumps(value))
+        parts.append(b"}")
+        return b"".join(parts)
@@ -0,0 +1,143 @@
+import os
+import math
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken  # Opcional: contagem exata para modelos com vocabulário parecido com o da OpenAI
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Orçamento de tokens do prompt
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "6000"))  # Teto mesmo para modelos de contexto enorme (latência/custo)
+RESPONSE_RESERVE_TOKENS = int(os.getenv("RESPONSE_RESERVE_TOKENS", "1024"))  # Espaço deixado para a resposta
+DEFAULT_CONTEXT_WINDOW = 8192  # Usado para modelos sem janela de contexto conhecida
+CHARS_PER_TOKEN = 3.5  # Estimativa quando o tiktoken não está instalado
+MESSAGE_OVERHEAD_TOKENS = 4  # Papel e separadores de cada mensagem
+
+
+def estimate_tokens(text: str) -> int:
+    """Conta (ou estima) o número de tokens de um texto
+
+    Args:
+        text: Texto
+
+    Returns:
+        Número de tokens
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """Número de tokens de uma mensagem, incluindo o custo fixo de cada mensagem"""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def prompt_budget(context_window: Optional[int]) -> int:
+    """Calcula quantos tokens o prompt pode ocupar para um modelo
+
+    Args:
+        context_window: Janela de contexto do modelo em tokens (None se desconhecida)
+
+    Returns:
+        Orçamento de tokens para system prompt, resumo e histórico
+    """
+    window = context_window or DEFAULT_CONTEXT_WINDOW
+    return max(0, min(window - RESPONSE_RESERVE_TOKENS, MAX_PROMPT_TOKENS))
+
+
+def build_context(system_message: Dict[str, str], turns: List[Tuple[int, Dict[str, str]]], question: Dict[str, str],
+                  budget: int, summary: Optional[str] = None) -> Tuple[List[Dict[str, str]], List[Tuple[int, Dict[str, str]]]]:
+    """Monta as mensagens de uma requisição dentro de um orçamento de tokens
+
+    O system prompt, o resumo e a pergunta atual sempre entram; do histórico
+    entram os turnos mais recentes que couberem. Os mais antigos que
+    sobrarem são devolvidos para serem incorporados ao resumo.
+
+    Args:
+        system_message: Mensagem de sistema (persona)
+        turns: Histórico como [(seq, mensagem), ...], do mais antigo para o mais novo
+        question: Mensagem atual do usuário
+        budget: Orçamento de tokens (veja prompt_budget)
+        summary: Resumo das partes antigas da conversa, se houver
+
+    Returns:
+        Tupla (mensagens sem o system prompt, turnos que ficaram de fora)
+    """
+    prefix = []
+    if summary:
+        prefix.append({"role": "system", "content": f"Resumo da conversa até aqui:\n{summary}"})
+
+    used = message_tokens(system_message) + message_tokens(question) + sum(message_tokens(m) for m in prefix)
+    start = len(turns)
+    while start > 0:
+        cost = message_tokens(turns[start - 1][1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+
+    # Não começa o recorte com uma resposta órfã do assistente
+    while start < len(turns) and turns[start][1].get("role") == "assistant":
+        start += 1
+
+    recent = [message for _, message in turns[start:]]
+    return prefix + recent + [question], turns[:start]
+
+
+def recall_message(snippets: List[str], budget: int) -> Optional[Dict[str, str]]:
+    """Monta a mensagem de sistema com trechos recuperados da memória de longo prazo
+
+    Args:
+        snippets: Trechos de conversas antigas, em ordem cronológica
+        budget: Máximo de tokens da mensagem
+
+    Returns:
+        Mensagem de sistema, ou None se nenhum trecho couber
+    """
+    header = "Trechos anteriores desta conversa que podem ser relevantes:"
+    used = message_tokens({"content": header})
+    kept = []
+    for snippet in snippets:
+        cost = estimate_tokens(snippet) + 2
+        if used + cost > budget:
+            break
+        kept.append(snippet)
+        used += cost
+    if not kept:
+        return None
+    return {"role": "system", "content": header + "\n\n" + "\n---\n".join(kept)}
+
+
+def summary_request(summary: Optional[str], turns: List[Tuple[int, Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Monta a requisição que incorpora turnos antigos ao resumo da conversa
+
+    Args:
+        summary: Resumo atual (ou None)
+        turns: Turnos a incorporar como [(seq, mensagem), ...]
+
+    Returns:
+        Mensagens para enviar ao modelo
+    """
+    transcript = "\n".join(
+        f"{'Usuário' if message.get('role') == 'user' else 'Kurama'}: {message.get('content', '')}"
+        for _, message in turns
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Você mantém o resumo de uma conversa longa. Atualize o resumo existente com os novos trechos, "
+                "preservando fatos, nomes, preferências e decisões importantes. Responda apenas com o novo resumo, "
+                "em no máximo 200 palavras."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"Resumo atual:\n{summary or '(vazio)'}\n\nNovos trechos:\n{transcript}"
+        }
+    ]
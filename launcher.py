@@ -0,0 +1,98 @@
+import os
+import sys
+import signal
+import asyncio
+import logging
+import aiohttp
+from typing import List
+from dotenv import load_dotenv
+
+# Inicia o bot em vários processos, cada um com uma faixa de shards.
+# Uso: python launcher.py  (em vez de python main.py)
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DISCORD_API = "https://discord.com/api/v10"
+CLUSTER_PROCESSES = int(os.getenv("CLUSTER_PROCESSES", str(os.cpu_count() or 1)))  # Processos do cluster
+RESTART_DELAY = float(os.getenv("CLUSTER_RESTART_DELAY", "5"))  # Espera (s) antes de reiniciar um processo que caiu
+
+# Estado compartilhado entre os processos: tudo que é por canal precisa vir do Postgres
+SHARED_ENV = {
+    "RATE_LIMIT_BACKEND": "postgres",  # Limites valem para o cluster inteiro
+    "SETTINGS_NOTIFY": "true",  # Mudanças de configuração invalidam o cache dos outros processos
+}
+
+
+async def recommended_shards(token: str) -> int:
+    """Consulta o número de shards recomendado pelo Discord"""
+    async with aiohttp.ClientSession(headers={"Authorization": f"Bot {token}"}) as session:
+        async with session.get(f"{DISCORD_API}/gateway/bot") as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"]
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Divide os shards em faixas contíguas, uma por processo"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def run_worker(index: int, shard_count: int, shard_ids: List[int], stopping: asyncio.Event):
+    """Mantém um processo do bot rodando com uma faixa de shards, reiniciando se cair"""
+    env = {**SHARED_ENV, **os.environ}
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(str(i) for i in shard_ids)
+    if env.get("METRICS_PORT"):
+        env["METRICS_PORT"] = str(int(env["METRICS_PORT"]) + index)  # Uma porta de métricas por processo
+    label = f"shards {shard_ids[0]}-{shard_ids[-1]}"
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    while not stopping.is_set():
+        process = await asyncio.create_subprocess_exec(sys.executable, main_py, env=env)
+        logging.info(f"Processo {process.pid} iniciado ({label})")
+        waiter = asyncio.create_task(process.wait())
+        stopper = asyncio.create_task(stopping.wait())
+        await asyncio.wait({waiter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            process.terminate()  # SIGTERM: o bot grava o histórico, as métricas pendentes e o snapshot antes de sair
+            await waiter
+            return
+        stopper.cancel()
+        logging.warning(f"Processo {process.pid} ({label}) saiu com código {process.returncode}")
+        try:
+            await asyncio.wait_for(stopping.wait(), RESTART_DELAY)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main():
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        raise ValueError("DISCORD_TOKEN é necessário no arquivo .env")
+
+    shard_count = int(os.getenv("SHARD_COUNT") or 0) or await recommended_shards(token)
+    ranges = shard_ranges(shard_count, CLUSTER_PROCESSES)
+    logging.info(f"Iniciando {shard_count} shards em {len(ranges)} processos")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C encerra os processos filhos diretamente
+
+    await asyncio.gather(*(run_worker(i, shard_count, ids, stopping) for i, ids in enumerate(ranges)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,81 +1,240 @@
 import os
+import json
+import asyncio
+import hashlib
+import signal
+import time
 import discord
-import requests
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
-import json
-from typing import Dict, List, Optional
-import time
-from database import Database
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
 
+# Carrega o .env antes dos módulos do bot, que leem suas configurações na importação
 load_dotenv()
 
+from database import Database
+from openrouter import OpenRouterClient, OpenRouterError, OpenRouterResponseError
+from streaming import MAX_MESSAGE_LENGTH, ReplyStreamer, split_message
+from ratelimit import MemoryRateLimitBackend, PostgresRateLimitBackend, RateLimiter
+from channel_queue import ChannelQueue, Debouncer
+from context import build_context, prompt_budget, recall_message, summary_request
+from memory import LongTermMemory
+from cache import ResponseCache
+from router import ModelRouter
+from scheduler import LLMScheduler
+from admission import AdmissionController, Supersession, interaction_deadline
+import telemetry
+from telemetry import ADMISSION, COMMAND_SECONDS, DB_POOL, SCHEDULER, STAGE_SECONDS, LLM_SECONDS, LLM_TOKENS, span
+
 TOKEN = os.getenv("DISCORD_TOKEN")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-if not TOKEN or not OPENROUTER_API_KEY:
-    raise ValueError("DISCORD_TOKEN e OPENROUTER_API_KEY são necessários no arquivo .env")
+# Cliente HTTP assíncrono compartilhado com o OpenRouter
+ai_client = OpenRouterClient(OPENROUTER_API_KEY)
+# Toda chamada à IA passa pelo agendador: limites de concorrência, backoff de 429 e rodízio entre servidores
+llm_scheduler = LLMScheduler()
+# Escolhe entre o modelo do canal e os fallbacks conforme latência e falhas recentes
+model_router = ModelRouter(ai_client, llm_scheduler)
+# Recusa ou rebaixa para um modelo mais rápido as perguntas que não terminariam no prazo
+admissao = AdmissionController(llm_scheduler, model_router)
+# Uma nova pergunta do mesmo usuário no mesmo canal cancela a anterior que ainda não terminou
+substituicoes = Supersession()
+
+def ler_shard_ids(valor: Optional[str]) -> Optional[List[int]]:
+    """Converte SHARD_IDS ("0,1,2" ou "0-3") em lista de IDs"""
+    if not valor:
+        return None
+    ids = []
+    for parte in valor.split(","):
+        inicio, _, fim = parte.strip().partition("-")
+        ids.extend(range(int(inicio), int(fim or inicio) + 1))
+    return ids
+
+# Sharding: sem variáveis, o discord.py escolhe o número de shards recomendado e roda todos neste processo.
+# O launcher.py divide os shards entre vários processos definindo SHARD_COUNT e SHARD_IDS para cada um.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None  # Total de shards do bot
+SHARD_IDS = ler_shard_ids(os.getenv("SHARD_IDS"))  # Shards atendidos por este processo
+# Força o tree.sync() mesmo que os comandos não tenham mudado desde a última sincronização
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "false").lower() in ("1", "true", "on")
+
+class KuramaBot(commands.AutoShardedBot):
+    _fechamento: Optional[asyncio.Task] = None
+
+    async def setup_hook(self):
+        # Roda uma única vez por processo, antes de conectar ao gateway (on_ready repete a cada reconexão)
+        await ai_client.start()  # Abre a sessão HTTP uma única vez
+        await db.setup()  # Pool de conexões e migrações do esquema
+        if self.shard_ids is None or 0 in self.shard_ids:
+            await sincronizar_comandos()  # Só um processo do cluster sincroniza
+        self.metrics_runner = await telemetry.start_metrics_server()  # GET /metrics, se METRICS_PORT estiver definido
+        # O Client.run só trata KeyboardInterrupt; sem isto, o SIGTERM de um redeploy (ou do launcher.py)
+        # mataria o processo sem gravar o histórico e as métricas pendentes nem o snapshot das conversas
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.create_task(self.close()))
+            except NotImplementedError:
+                pass  # Windows: o Ctrl+C continua chegando como KeyboardInterrupt
+
+    async def close(self):
+        # Chamado pelo sinal e de novo pelo Client.run ao sair: só a primeira chamada fecha, as outras esperam
+        if self._fechamento is None:
+            self._fechamento = asyncio.create_task(self._fechar())
+        await self._fechamento
+
+    async def _fechar(self):
+        # Primeiro o gateway (não chegam mais eventos), depois o trabalho em andamento, e só então
+        # a sessão HTTP e o banco: nenhum persist_turn pode chegar depois da última gravação do histórico
+        await super().close()
+        await rajadas.close()
+        await fila_conversas.close()
+        await substituicoes.close()
+        if getattr(self, "metrics_runner", None) is not None:
+            await self.metrics_runner.cleanup()
+        await ai_client.close()
+        await db.close()
 
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = KuramaBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 tree = bot.tree
 
 # Inicializa o banco de dados
 db = Database()
 
 DEFAULT_MODEL = "deepseek/deepseek-chat-v3-0324:free"
-MAX_HISTORY_LENGTH = 15
-MAX_MESSAGE_LENGTH = 2000  # Limite do Discord
+HISTORY_FETCH_LIMIT = 100  # Máximo de mensagens lidas do banco por turno (o orçamento de tokens decide quantas vão ao modelo)
+SUMMARY_MIN_TURNS = 4  # Só resume quando pelo menos esta quantidade de mensagens antigas ficou fora do contexto
+# Memória de longo prazo: trechos antigos relevantes para a pergunta entram no prompt (modo contínuo)
+LONG_TERM_MEMORY = os.getenv("LONG_TERM_MEMORY", "true").lower() in ("1", "true", "on")
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "600"))  # Parte do orçamento do prompt reservada aos trechos
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL")  # Modelo usado nos resumos (padrão: o do canal)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))  # Respostas mantidas em memória
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # Validade de uma resposta em cache (segundos)
+# Agrupa perguntas que chegam juntas no mesmo canal (modo contínuo) em uma única chamada à IA
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() in ("1", "true", "on")
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "5"))
+# Modo contínuo: mensagens comuns enviadas em sequência no canal são respondidas de uma vez
+CHAT_DEBOUNCE_WINDOW = float(os.getenv("CHAT_DEBOUNCE_WINDOW", "2"))  # Silêncio (s) que encerra uma rajada
+CHAT_DEBOUNCE_MAX_WAIT = float(os.getenv("CHAT_DEBOUNCE_MAX_WAIT", "8"))  # Espera máxima (s) desde a primeira mensagem
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "on")  # Mostra a resposta enquanto é gerada
+COMPARE_DEADLINE = float(os.getenv("COMPARE_DEADLINE", "60"))  # Prazo total (s) do /compare; quem não respondeu é cancelado
+COMPARE_EDIT_INTERVAL = 1.5  # Intervalo mínimo (s) entre edições do embed do /compare (limite de edições do Discord)
+EMBED_MAX_LENGTH = 6000  # Limite do Discord para o texto somado de um embed (título, descrição, campos e rodapé)
+EMBED_FIELD_MAX_LENGTH = 1024  # Limite do Discord para o valor de cada campo
 
 # Configurações de rate limiting
 RATE_LIMIT = {
     "window": 60,  # segundos
     "max_requests": 10  # máximo de requisições por janela
 }
-user_requests = {}  # {user_id: [(timestamp, command), ...]}
+RATE_LIMIT_POR_COMANDO = {}  # Limites específicos, ex: {"code": {"window": 60, "max_requests": 5}}
+RATE_LIMIT_POR_GUILD = None  # Limite total de cada servidor, ex: {"window": 60, "max_requests": 60}
+# "memory" (padrão, um processo) ou "postgres" (estado compartilhado entre réplicas; o launcher.py usa este)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+rate_limiter = RateLimiter(
+    PostgresRateLimitBackend(db) if RATE_LIMIT_BACKEND == "postgres" else MemoryRateLimitBackend(),
+    RATE_LIMIT,
+    per_command=RATE_LIMIT_POR_COMANDO,
+    per_guild=RATE_LIMIT_POR_GUILD
+)
 
 modelos_validos = {
     "deepseek-chat": {
         "id": "deepseek-ai/deepseek-chat",
-        "desc": "DeepSeek Chat (geral, gratuito)"
+        "desc": "DeepSeek Chat (geral, gratuito)",
+        "contexto": 64000
     },
     "deepseek-chat-v3": {
         "id": "deepseek/deepseek-chat-v3-0324:free",
-        "desc": "DeepSeek Chat v3-0324 (Sucessor do DeepSeek V3, mais rápido)"
+        "desc": "DeepSeek Chat v3-0324 (Sucessor do DeepSeek V3, mais rápido)",
+        "contexto": 163840
     },
     "deepseek-coder": {
         "id": "deepseek-ai/deepseek-coder:7b-instruct",
-        "desc": "DeepSeek Coder (focado em programação, gratuito)"
+        "desc": "DeepSeek Coder (focado em programação, gratuito)",
+        "contexto": 16384
     },
     "mistral": {
         "id": "mistral/mistral-7b-instruct",
-        "desc": "Mistral 7B (rápido, gratuito)"
+        "desc": "Mistral 7B (rápido, gratuito)",
+        "contexto": 32768
     },
     "gpt-3.5": {
         "id": "openai/gpt-3.5-turbo",
-        "desc": "GPT-3.5 Turbo (chat geral, OpenAI)"
+        "desc": "GPT-3.5 Turbo (chat geral, OpenAI)",
+        "contexto": 16385
     },
     "claude": {
         "id": "anthropic/claude-3-haiku",
-        "desc": "Claude 3 Haiku (ótimo para texto longo, gratuito)"
+        "desc": "Claude 3 Haiku (ótimo para texto longo, gratuito)",
+        "contexto": 200000
     },
     "llama3": {
         "id": "meta-llama/llama-3-8b-instruct",
-        "desc": "LLaMA 3 (Meta, modelo novo, gratuito)"
+        "desc": "LLaMA 3 (Meta, modelo novo, gratuito)",
+        "contexto": 8192
     }
 }
 
-historico_por_canal = {}
-modo_continuo_por_canal = {}
-modelo_por_canal = {}
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "Você é Kurama, a Raposa de Nove Caudas do anime Naruto. "
+        "Você é poderoso, sábio e sarcástico. Fala com autoridade e confiança, "
+        "usando frases como 'criaturas tolas', 'insolentes' ou 'patéticos humanos'. "
+        "Apesar da aparência hostil, você protege quem merece. Responda sempre como Kurama, "
+        "com tom firme, arrogante, mas com toques de sabedoria ancestral."
+    )
+}
+
+def janela_de_contexto(modelo: str) -> Optional[int]:
+    """Retorna a janela de contexto (em tokens) de um ID de modelo, se conhecida"""
+    for info in modelos_validos.values():
+        if info["id"] == modelo:
+            return info["contexto"]
+    return None
+
+# Respostas devolvidas quando a chamada à IA falha (nunca entram no cache)
+ERRO_API = "Desculpe, estou tendo problemas para processar sua solicitação. Tente novamente mais tarde."
+ERRO_RESPOSTA = "Ocorreu um erro ao processar a resposta. Por favor, tente novamente."
+ERRO_PRAZO = "Desculpe, a IA demorou demais para responder. Tente novamente em instantes."
+ERROS = (ERRO_API, ERRO_RESPOSTA, ERRO_PRAZO)
+AVISO_SOBRECARGA = "⏳ A IA está sobrecarregada no momento (espera estimada de {espera:.0f}s). Tente novamente em instantes."
+
+# Cache de respostas para perguntas sem histórico (memória + Postgres)
+response_cache = ResponseCache(db, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+# Índice por canal dos turnos antigos, para recuperar o que já saiu da janela recente
+memoria_longa = LongTermMemory(db) if LONG_TERM_MEMORY else None
+
+def hash_dos_comandos() -> str:
+    """Hash do payload dos slash commands, para saber se precisam ser sincronizados de novo"""
+    payload = []
+    for comando in tree.get_commands():
+        try:
+            payload.append(comando.to_dict(tree))
+        except TypeError:
+            payload.append(comando.to_dict())  # discord.py < 2.4
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+async def sincronizar_comandos():
+    """Sincroniza os slash commands com o Discord só quando mudaram desde a última vez"""
+    chave = f"command_tree_hash:{bot.application_id}"
+    atual = hash_dos_comandos()
+    if not FORCE_COMMAND_SYNC and await db.get_bot_state(chave) == atual:
+        print("⏭️ Comandos inalterados, sincronização ignorada")
+        return
+    await tree.sync()
+    await db.set_bot_state(chave, atual)
+    print("🔄 Comandos sincronizados")
 
 @bot.event
 async def on_ready():
-    await db._init_db()  # Inicializa o banco de dados
-    await tree.sync()
-    print(f"✅ Logado como {bot.user}")
+    shards = ", ".join(str(i) for i in sorted(bot.shards))
+    print(f"✅ Logado como {bot.user} (shards {shards} de {bot.shard_count})")
 
 @tree.command(name="modelos", description="Lista os modelos de IA disponíveis")
 async def modelos(interaction: discord.Interaction):
@@ -96,7 +255,8 @@ async def model(interaction: discord.Interaction, model_name: str = None):
 
     model_key = model_name.lower()
     if model_key in modelos_validos:
-        await db.save_channel_settings(canal, modelos_validos[model_key]["id"], False)
+        settings = await db.get_channel_settings(canal)
+        await db.save_channel_settings(canal, modelos_validos[model_key]["id"], settings["continuous_mode"])
         await interaction.response.send_message(f"✅ Modelo deste canal alterado para `{modelos_validos[model_key]['id']}`")
     else:
         await interaction.response.send_message("❌ Modelo inválido. Use `/modelos` para ver a lista disponível.")
@@ -104,7 +264,8 @@ async def model(interaction: discord.Interaction, model_name: str = None):
 @tree.command(name="reset", description="Restaura o modelo padrão para este canal")
 async def reset(interaction: discord.Interaction):
     canal = interaction.channel.id
-    modelo_por_canal.pop(canal, None)
+    settings = await db.get_channel_settings(canal)
+    await db.save_channel_settings(canal, None, settings["continuous_mode"])
     await interaction.response.send_message(f"🔄 Modelo deste canal resetado para o padrão: `{DEFAULT_MODEL}`")
 
 @tree.command(name="ia", description="Ativa, desativa ou consulta o modo contínuo")
@@ -123,10 +284,33 @@ async def ia(interaction: discord.Interaction, modo: str = None):
         estado = settings["continuous_mode"]
         await interaction.response.send_message(f"🔎 Modo contínuo está: {'ativado ✅' if estado else 'desativado ❌'}")
 
+@tree.command(name="cache", description="Ativa, desativa ou consulta o cache de respostas do canal")
+@app_commands.describe(modo="Escolha on, off ou deixe em branco para ver o estado atual")
+async def cache(interaction: discord.Interaction, modo: str = None):
+    canal = interaction.channel.id
+    settings = await db.get_channel_settings(canal)
+
+    if modo == "on":
+        await db.save_channel_settings(canal, settings["model"], settings["continuous_mode"], True)
+        await interaction.response.send_message("⚡ Cache de respostas **ativado** para este canal.")
+    elif modo == "off":
+        await db.save_channel_settings(canal, settings["model"], settings["continuous_mode"], False)
+        await interaction.response.send_message("🚫 Cache de respostas **desativado** para este canal.")
+    else:
+        estado = settings["response_cache"]
+        stats = response_cache.stats()
+        await interaction.response.send_message(
+            f"🔎 Cache de respostas está: {'ativado ✅' if estado else 'desativado ❌'}\n"
+            f"📈 Acertos: {stats['hits']} (memória) + {stats['db_hits']} (banco) | Falhas: {stats['misses']} | "
+            f"Taxa de acerto: {stats['hit_rate']:.0%}"
+        )
+
 @tree.command(name="resetmemoria", description="Apaga a memória de conversas deste canal")
 async def resetmemoria(interaction: discord.Interaction):
     canal = interaction.channel.id
-    await db.save_message_history(canal, [])
+    await db.clear_message_history(canal)
+    if memoria_longa is not None:
+        memoria_longa.forget(canal)
     await interaction.response.send_message("🧽 Memória deste canal apagada com sucesso!")
 
 @tree.command(name="ajuda", description="Lista os comandos disponíveis")
@@ -138,168 +322,441 @@ async def ajuda(interaction: discord.Interaction):
     )
     embed.add_field(name="/ask", value="Pergunte algo à IA.", inline=False)
     embed.add_field(name="/code", value="Recebe a resposta formatada como código.", inline=False)
+    embed.add_field(name="/compare", value="Envia a mesma pergunta a vários modelos e compara as respostas.", inline=False)
     embed.add_field(name="/modelos", value="Lista os modelos de IA disponíveis.", inline=False)
     embed.add_field(name="/model", value="Define o modelo de IA no canal.", inline=False)
     embed.add_field(name="/reset", value="Reseta o modelo para o padrão.", inline=False)
     embed.add_field(name="/ia", value="Ativa/desativa o modo contínuo.", inline=False)
     embed.add_field(name="/resetmemoria", value="Apaga a memória do canal.", inline=False)
+    embed.add_field(name="/cache", value="Ativa/desativa o cache de respostas do canal.", inline=False)
     embed.add_field(name="/ajuda", value="Mostra esta lista de comandos.", inline=False)
 
     canal = interaction.channel.id
-    modelo_atual = modelo_por_canal.get(canal, DEFAULT_MODEL)
+    settings = await db.get_channel_settings(canal)
+    modelo_atual = settings["model"] or DEFAULT_MODEL
     embed.set_footer(text=f"🧠 Modelo atual: {modelo_atual}")
 
     await interaction.response.send_message(embed=embed)
 
-def get_ai_response(messages: List[Dict[str, str]], canal_id: int) -> str:
+async def get_ai_response(messages: List[Dict[str, str]], canal_id: int, on_delta=None, guild_id: Optional[int] = None,
+                          modelo: Optional[str] = None, prazo: Optional[float] = None, on_model=None) -> str:
+    if modelo is None:
+        settings = await db.get_channel_settings(canal_id)  # Vem do cache na maioria das vezes
+        modelo = settings["model"] or DEFAULT_MODEL
+
     try:
-        modelo = modelo_por_canal.get(canal_id, DEFAULT_MODEL)
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        system_message = {
-            "role": "system",
-            "content": (
-                "Você é Kurama, a Raposa de Nove Caudas do anime Naruto. "
-                "Você é poderoso, sábio e sarcástico. Fala com autoridade e confiança, "
-                "usando frases como 'criaturas tolas', 'insolentes' ou 'patéticos humanos'. "
-                "Apesar da aparência hostil, você protege quem merece. Responda sempre como Kurama, "
-                "com tom firme, arrogante, mas com toques de sabedoria ancestral."
-            )
-        }
-
-        json_data = {
-            "model": modelo,
-            "messages": [system_message] + messages
-        }
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=json_data,
-            timeout=30  # Timeout de 30 segundos
+        if on_delta is None:
+            return await model_router.complete(modelo, [SYSTEM_MESSAGE] + messages, key=guild_id, deadline=prazo, on_model=on_model)
+
+        # Streaming: repassa cada trecho assim que chega (o prazo vale até o primeiro)
+        partes = []
+        async for delta in model_router.stream(modelo, [SYSTEM_MESSAGE] + messages, key=guild_id, deadline=prazo, on_model=on_model):
+            partes.append(delta)
+            await on_delta(delta)
+        return "".join(partes)
+    except asyncio.TimeoutError:
+        # O roteador já cancelou as chamadas em andamento, liberando as vagas para quem ainda pode ser atendido
+        ADMISSION.inc(decision="deadline")
+        return ERRO_PRAZO
+    except OpenRouterResponseError as e:
+        print(str(e))
+        return ERRO_RESPOSTA
+    except OpenRouterError as e:
+        print(str(e))
+        return ERRO_API
+
+tarefas_em_segundo_plano = set()  # Mantém referência às tarefas até terminarem
+resumos_em_andamento = set()  # Canais com um resumo sendo gerado
+
+def em_segundo_plano(coro):
+    """Agenda uma corrotina sem esperar por ela"""
+    tarefa = asyncio.create_task(coro)
+    tarefas_em_segundo_plano.add(tarefa)
+    tarefa.add_done_callback(tarefas_em_segundo_plano.discard)
+
+async def atualizar_resumo(canal: int, guild_id: Optional[int], modelo: str, resumo: Optional[str], excedentes: List[tuple]):
+    """Incorpora ao resumo do canal as mensagens que não cabem mais no contexto"""
+    if canal in resumos_em_andamento:
+        return
+    resumos_em_andamento.add(canal)
+    try:
+        novo_resumo = await model_router.complete(SUMMARY_MODEL or modelo, summary_request(resumo, excedentes), key=guild_id)
+        await db.save_conversation_summary(canal, novo_resumo.strip(), excedentes[-1][0])
+    except OpenRouterError as e:
+        print(f"Erro ao resumir conversa: {str(e)}")
+    finally:
+        resumos_em_andamento.discard(canal)
+
+class Pedido(NamedTuple):
+    """Uma pergunta a ser respondida pela IA"""
+    user: discord.abc.User  # Autor (usado nas métricas e para identificar perguntas agrupadas)
+    pergunta: str
+    comando: str  # "ask", "code" ou "chat" (mensagens comuns no modo contínuo)
+    guild_id: Optional[int]
+    enviar: Callable[[str], Awaitable]  # Envia uma nova mensagem no destino da resposta e a retorna
+    prazo: Optional[float] = None  # time.monotonic() até quando a resposta precisa começar (controle de admissão)
+
+def pedido_de_interacao(interaction: discord.Interaction, pergunta: str, comando: str) -> Pedido:
+    """Cria um Pedido cujas respostas vão como followup de uma interação"""
+    idade = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    return Pedido(
+        interaction.user, pergunta, comando, interaction.guild_id,
+        lambda conteudo: interaction.followup.send(conteudo, wait=True),
+        interaction_deadline(idade)
+    )
+
+def juntar_perguntas(pedidos: List[Pedido]) -> str:
+    """Monta o conteúdo da mensagem do usuário para um ou mais pedidos agrupados"""
+    if len(pedidos) == 1:
+        return pedidos[0].pergunta
+    partes = ["Várias perguntas chegaram ao mesmo tempo neste canal. Responda a cada uma delas, indicando o autor:"]
+    for pedido in pedidos:
+        partes.append(f"**{pedido.user.display_name}:** {pedido.pergunta}")
+    return "\n\n".join(partes)
+
+async def responder_pedidos(canal: int, pedidos: List[Pedido]):
+    """Gera uma única resposta da IA para um ou mais pedidos do mesmo canal"""
+    pedido = pedidos[-1]
+    comando = pedido.comando
+    code_block = comando == "code"
+
+    # Recupera configurações do canal
+    with span("settings", command=comando):
+        settings = await db.get_channel_settings(canal)
+    modelo = settings["model"] or DEFAULT_MODEL
+    mensagem_usuario = {"role": "user", "content": juntar_perguntas(pedidos)}
+
+    # Monta o contexto dentro do orçamento de tokens do modelo: resumo + turnos mais recentes
+    excedentes = []
+    if settings["continuous_mode"]:
+        # Resumo e histórico numa única consulta
+        with span("load_conversation", command=comando):
+            conversa = await db.load_conversation(canal, HISTORY_FETCH_LIMIT)
+        with span("build_context", command=comando):
+            resumo, turnos = conversa["summary"], conversa["turns"]
+            orcamento = prompt_budget(janela_de_contexto(modelo))
+            if memoria_longa is not None:
+                orcamento = max(0, orcamento - MEMORY_MAX_TOKENS)
+            historico, excedentes = build_context(SYSTEM_MESSAGE, turnos, mensagem_usuario, orcamento, resumo)
+        if memoria_longa is not None:
+            with span("memory_recall", command=comando):
+                # Só turnos anteriores à janela recente (que já vai inteira no prompt)
+                inicio_janela = turnos[len(excedentes)][0] if len(excedentes) < len(turnos) else float("inf")
+                lembranca = recall_message(
+                    memoria_longa.recall(canal, mensagem_usuario["content"], inicio_janela), MEMORY_MAX_TOKENS
+                )
+            if lembranca is not None:
+                historico.insert(1 if resumo else 0, lembranca)
+    else:
+        historico = [mensagem_usuario]
+
+    # Sem histórico a requisição só depende do modelo e da pergunta: tenta o cache
+    chave_cache = None
+    if not settings["continuous_mode"] and settings["response_cache"]:
+        chave_cache = ResponseCache.make_key(modelo, SYSTEM_MESSAGE["content"], mensagem_usuario["content"])
+        with span("cache_lookup", command=comando):
+            em_cache = await response_cache.get(chave_cache)
+        if em_cache is not None:
+            with span("discord_send", command=comando):
+                for parte in split_message(em_cache, code_block=code_block):
+                    await pedido.enviar(parte)
+            return
+
+    # Controle de admissão: com o OpenRouter lento, o que não terminaria no prazo é recusado
+    # agora ou vai para um modelo mais rápido, em vez de esperar na fila até o timeout
+    prazos = [p.prazo for p in pedidos if p.prazo is not None]
+    decisao = admissao.decide(modelo, max(prazos) if prazos else None, STREAM_RESPONSES)
+    if decisao.action == "refuse":
+        for p in pedidos:
+            await p.enviar(AVISO_SOBRECARGA.format(espera=decisao.estimate))
+        return
+
+    # Pedidos agrupados: a resposta vai na mensagem do último, os demais recebem um aviso
+    for anterior in pedidos[:-1]:
+        await anterior.enviar("↪️ Sua pergunta foi respondida junto com as outras deste canal, logo abaixo.")
+
+    streamer = ReplyStreamer(pedido.enviar, code_block)
+    respondeu = []  # Modelo que de fato respondeu (hedge e fallback podem trocar o do canal)
+    # Com streaming, inclui as edições da mensagem feitas enquanto a resposta chega
+    with span("llm", command=comando, model=decisao.model):
+        response = await get_ai_response(
+            historico, canal, streamer.feed if STREAM_RESPONSES else None, pedido.guild_id,
+            modelo=decisao.model, prazo=max(prazos) if prazos else None, on_model=respondeu.append
         )
-        response.raise_for_status()  # Levanta exceção para códigos de erro HTTP
-        
-        return response.json()['choices'][0]['message']['content']
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Erro na API: {str(e)}")
-        return "Desculpe, estou tendo problemas para processar sua solicitação. Tente novamente mais tarde."
-    except (KeyError, json.JSONDecodeError) as e:
-        print(f"Erro ao processar resposta: {str(e)}")
-        return "Ocorreu um erro ao processar a resposta. Por favor, tente novamente."
-
-def check_rate_limit(user_id: int, command: str) -> bool:
-    """Verifica se o usuário excedeu o limite de requisições"""
-    current_time = time.time()
-    
-    # Limpa requisições antigas
-    if user_id in user_requests:
-        user_requests[user_id] = [
-            (ts, cmd) for ts, cmd in user_requests[user_id]
-            if current_time - ts < RATE_LIMIT["window"]
-        ]
-    
-    # Adiciona nova requisição
-    if user_id not in user_requests:
-        user_requests[user_id] = []
-    user_requests[user_id].append((current_time, command))
-    
-    # Verifica limite
-    return len(user_requests[user_id]) <= RATE_LIMIT["max_requests"]
+        await streamer.finish()
+
+    # A resposta fica em cache com a chave do modelo que respondeu, não com a do modelo do canal
+    if chave_cache and respondeu and response not in ERROS:
+        if respondeu[0] != modelo:
+            chave_cache = ResponseCache.make_key(respondeu[0], SYSTEM_MESSAGE["content"], mensagem_usuario["content"])
+        with span("cache_store", command=comando):
+            await response_cache.set(chave_cache, respondeu[0], response)
+
+    # Salva o novo turno se modo contínuo estiver ativo
+    if settings["continuous_mode"]:
+        # Turno e métricas de uso na mesma transação
+        mensagem_resposta = {"role": "assistant", "content": response}
+        with span("persist_turn", command=comando):
+            seqs = await db.persist_turn(
+                canal,
+                [mensagem_usuario, mensagem_resposta],
+                [(p.user.id, p.comando) for p in pedidos]
+            )
+        if memoria_longa is not None and seqs and response not in ERROS:
+            memoria_longa.remember(canal, seqs[0], mensagem_usuario, mensagem_resposta)
+        if len(excedentes) >= SUMMARY_MIN_TURNS:
+            em_segundo_plano(atualizar_resumo(canal, pedido.guild_id, modelo, resumo, excedentes))
+
+    # Sem streaming (ou se a geração falhou), envia a resposta em partes de até 2000 caracteres
+    if response != streamer.text:
+        with span("discord_send", command=comando):
+            for parte in split_message(response, code_block=code_block):
+                await pedido.enviar(parte)
+
+# Serializa as atualizações de conversa de cada canal no modo contínuo; perguntas que
+# chegam enquanto uma resposta está sendo gerada podem ser respondidas numa só chamada
+fila_conversas = ChannelQueue(responder_pedidos, coalesce=COALESCE_REQUESTS, max_batch=COALESCE_MAX_BATCH)
+
+async def responder_rajada(canal: int, mensagens: List[discord.Message]):
+    """Responde de uma vez a uma rajada de mensagens comuns de um canal no modo contínuo"""
+    # O rate limit conta uma requisição por autor da rajada, não por linha digitada
+    guild_id = mensagens[-1].guild.id if mensagens[-1].guild else None
+    limitados = set()
+    for autor_id in dict.fromkeys(m.author.id for m in mensagens):
+        if not await rate_limiter.check(autor_id, "chat", guild_id):
+            limitados.add(autor_id)
+    if limitados:
+        for autor_id in limitados:
+            ultima_do_autor = [m for m in mensagens if m.author.id == autor_id][-1]
+            try:
+                await ultima_do_autor.reply(
+                    "⚠️ Você atingiu o limite de requisições. Por favor, aguarde um momento.", mention_author=False
+                )
+            except discord.HTTPException as e:
+                print(f"Erro ao avisar sobre o rate limit: {str(e)}")
+        mensagens = [m for m in mensagens if m.author.id not in limitados]
+        if not mensagens:
+            return
+
+    ultima = mensagens[-1]
+    autores = {m.author.id for m in mensagens}
+    if len(autores) == 1:
+        pergunta = "\n".join(db.sanitize_input(m.content) for m in mensagens)
+    else:
+        pergunta = "\n".join(f"{m.author.display_name}: {db.sanitize_input(m.content)}" for m in mensagens)
 
-@tree.command(name="ask", description="Faz uma pergunta à IA")
-@app_commands.describe(question="Sua pergunta para a IA")
-async def ask(interaction: discord.Interaction, question: str):
+    pedido = Pedido(
+        ultima.author, pergunta[:MAX_MESSAGE_LENGTH], "chat", guild_id,
+        lambda conteudo: ultima.reply(conteudo, mention_author=False),
+        interaction_deadline(0)
+    )
+    inicio = time.perf_counter()
+    try:
+        async with ultima.channel.typing():
+            await fila_conversas.submit(canal, pedido, batch_key="chat")
+    except Exception as e:
+        print(f"Erro ao responder mensagens do canal: {str(e)}")
+    finally:
+        COMMAND_SECONDS.observe(time.perf_counter() - inicio, command="chat")
+
+# Junta mensagens enviadas em sequência no mesmo canal numa única chamada à IA
+rajadas = Debouncer(responder_rajada, window=CHAT_DEBOUNCE_WINDOW, max_wait=CHAT_DEBOUNCE_MAX_WAIT)
+
+@bot.event
+async def on_message(message: discord.Message):
+    # Descarta o que não é conversa antes de qualquer acesso ao banco
+    if message.author.bot or not message.content or message.type not in (discord.MessageType.default, discord.MessageType.reply):
+        return
+
+    canal = message.channel.id
+    settings = db.peek_channel_settings(canal)  # Cache em memória
+    if settings is None:
+        settings = await db.get_channel_settings(canal)  # Só na primeira mensagem do canal (depois fica em cache)
+    if not settings["continuous_mode"]:
+        return
+
+    rajadas.add(canal, message)
+
+async def processar_pergunta(interaction: discord.Interaction, pergunta: str, comando: str):
+    """Fluxo comum do /ask e do /code: valida, consulta a IA e responde no canal"""
+    inicio = time.perf_counter()
+    try:
+        await _processar_pergunta(interaction, pergunta, comando)
+    finally:
+        COMMAND_SECONDS.observe(time.perf_counter() - inicio, command=comando)
+
+async def _processar_pergunta(interaction: discord.Interaction, pergunta: str, comando: str):
     # Sanitiza a entrada
-    question = db.sanitize_input(question)
+    pergunta = db.sanitize_input(pergunta)
 
     # Verifica rate limit
-    if not check_rate_limit(interaction.user.id, "ask"):
+    with span("rate_limit", command=comando):
+        permitido = await rate_limiter.check(interaction.user.id, comando, interaction.guild_id)
+    if not permitido:
         await interaction.response.send_message(
             "⚠️ Você atingiu o limite de requisições. Por favor, aguarde um momento."
         )
         return
 
-    if len(question) > MAX_MESSAGE_LENGTH:
+    if len(pergunta) > MAX_MESSAGE_LENGTH:
         await interaction.response.send_message(
             f"❌ Sua pergunta é muito longa. O limite é de {MAX_MESSAGE_LENGTH} caracteres."
         )
         return
 
     canal = interaction.channel.id
-    await interaction.response.defer()
+    with span("defer", command=comando):
+        await interaction.response.defer()
 
     try:
-        # Registra uso
-        await db.log_usage(canal, interaction.user.id, "ask")
-        
-        # Recupera configurações do canal
         settings = await db.get_channel_settings(canal)
-        historico = await db.get_message_history(canal) if settings["continuous_mode"] else []
-        
-        historico.append({"role": "user", "content": question})
-        response = get_ai_response(historico, canal)
-        historico.append({"role": "assistant", "content": response})
-        
-        # Salva histórico se modo contínuo estiver ativo
         if settings["continuous_mode"]:
-            await db.save_message_history(canal, historico)
-        
-        await interaction.followup.send(response)
+            # O uso é registrado junto com o turno, depois da resposta
+            await fila_conversas.submit(canal, pedido_de_interacao(interaction, pergunta, comando), batch_key=comando)
+        else:
+            # Registra uso
+            await db.log_usage(canal, interaction.user.id, comando)
+            concluido = await substituicoes.run(
+                (canal, interaction.user.id, comando),
+                responder_pedidos(canal, [pedido_de_interacao(interaction, pergunta, comando)])
+            )
+            if not concluido:
+                await interaction.followup.send("🔁 Esta pergunta foi substituída pela sua mais recente.")
     except Exception as e:
-        print(f"Erro ao processar pergunta: {str(e)}")
+        print(f"Erro ao processar {comando}: {str(e)}")
         await interaction.followup.send(
-            "Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente mais tarde."
+            "Desculpe, ocorreu um erro ao processar sua solicitação. Tente novamente mais tarde."
         )
 
+@tree.command(name="ask", description="Faz uma pergunta à IA")
+@app_commands.describe(question="Sua pergunta para a IA")
+async def ask(interaction: discord.Interaction, question: str):
+    await processar_pergunta(interaction, question, "ask")
+
 @tree.command(name="code", description="Faz uma pergunta e recebe a resposta como código")
 @app_commands.describe(pergunta="Pergunta para a IA")
 async def code(interaction: discord.Interaction, pergunta: str):
-    # Sanitiza a entrada
-    pergunta = db.sanitize_input(pergunta)
+    await processar_pergunta(interaction, pergunta, "code")
+
+def resumo_do_resultado(resultado: Optional[tuple]) -> str:
+    """Linha curta com o estado de um modelo no /compare (latência e tokens, se respondeu)"""
+    if resultado is None:
+        return "⏳ Aguardando resposta..."
+    if isinstance(resultado, asyncio.CancelledError):
+        return f"⌛ Sem resposta em {COMPARE_DEADLINE:g}s."
+    if isinstance(resultado, BaseException):
+        return f"❌ Falhou: {str(resultado)[:200]}"
+    _, uso, latencia = resultado
+    tokens = f"{uso.get('prompt_tokens', '?')} + {uso.get('completion_tokens', '?')} tokens" if uso else "tokens n/d"
+    return f"⏱️ {latencia:.1f}s · 🔤 {tokens}"
+
+def campo_da_comparacao(resultado: Optional[tuple], limite: int) -> str:
+    """Texto do campo de um modelo no embed do /compare, com no máximo `limite` caracteres"""
+    texto = resumo_do_resultado(resultado)
+    if isinstance(resultado, tuple):
+        texto += "\n" + (resultado[0].strip() or "(resposta vazia)")
+    return texto if len(texto) <= limite else texto[:limite - 1] + "…"
+
+def rodape_da_comparacao(nome: str, latencia: float) -> str:
+    return f"🏁 Mais rápido: {nome} ({latencia:.1f}s). Use /model {nome} para usá-lo neste canal."
+
+@tree.command(name="compare", description="Envia a mesma pergunta a vários modelos e compara as respostas")
+@app_commands.describe(
+    pergunta="Pergunta para os modelos",
+    modelos="Nomes separados por vírgula (padrão: todos; use /modelos para ver)"
+)
+async def compare(interaction: discord.Interaction, pergunta: str, modelos: str = None):
+    inicio = time.perf_counter()
+    try:
+        await _compare(interaction, pergunta, modelos)
+    finally:
+        COMMAND_SECONDS.observe(time.perf_counter() - inicio, command="compare")
 
-    # Verifica rate limit
-    if not check_rate_limit(interaction.user.id, "code"):
+async def _compare(interaction: discord.Interaction, pergunta: str, modelos: Optional[str]):
+    pergunta = db.sanitize_input(pergunta)
+    nomes = [m.strip().lower() for m in modelos.split(",") if m.strip()] if modelos else list(modelos_validos)
+    nomes = list(dict.fromkeys(nomes))  # Sem repetições, na ordem pedida
+    invalidos = [n for n in nomes if n not in modelos_validos]
+    if invalidos or not nomes:
         await interaction.response.send_message(
-            "⚠️ Você atingiu o limite de requisições. Por favor, aguarde um momento."
+            f"❌ Modelo inválido: {', '.join(invalidos) or '(nenhum)'}. Use `/modelos` para ver a lista disponível."
         )
         return
-
-    if len(pergunta) > MAX_MESSAGE_LENGTH:
+    if not await rate_limiter.check(interaction.user.id, "compare", interaction.guild_id):
         await interaction.response.send_message(
-            f"❌ Sua pergunta é muito longa. O limite é de {MAX_MESSAGE_LENGTH} caracteres."
+            "⚠️ Você atingiu o limite de requisições. Por favor, aguarde um momento."
         )
         return
 
-    canal = interaction.channel.id
     await interaction.response.defer()
+    canal = interaction.channel.id
+    await db.log_usage(canal, interaction.user.id, "compare")
 
+    # Todos os modelos ao mesmo tempo, pelo agendador compartilhado; o embed é atualizado conforme chegam
+    mensagens = [SYSTEM_MESSAGE, {"role": "user", "content": pergunta}]
+    tarefas = {
+        asyncio.create_task(model_router.measure(modelos_validos[nome]["id"], mensagens, key=interaction.guild_id)): nome
+        for nome in nomes
+    }
+    resultados: Dict[str, object] = {}
+    titulo = "⚖️ Comparação de modelos"
+    descricao = pergunta[:1000]
+    nomes_dos_campos = {nome: f"{nome} (`{modelos_validos[nome]['id']}`)" for nome in nomes}
+    # O limite de 6000 caracteres vale para o embed inteiro: cada campo fica com uma parte do que sobra
+    # depois do título, da descrição, dos nomes dos campos e do maior rodapé possível
+    fixo = len(titulo) + len(descricao) + sum(map(len, nomes_dos_campos.values()))
+    fixo += max(len(rodape_da_comparacao(nome, COMPARE_DEADLINE)) for nome in nomes)
+    limite = min(EMBED_FIELD_MAX_LENGTH, (EMBED_MAX_LENGTH - fixo) // len(nomes))
+
+    def montar_embed() -> discord.Embed:
+        embed = discord.Embed(title=titulo, description=descricao, color=discord.Color.gold())
+        for nome in nomes:
+            embed.add_field(name=nomes_dos_campos[nome], value=campo_da_comparacao(resultados.get(nome), limite), inline=False)
+        respondidos = [(r[2], nome) for nome, r in resultados.items() if isinstance(r, tuple)]
+        if len(resultados) == len(nomes) and respondidos:
+            latencia, mais_rapido = min(respondidos)
+            embed.set_footer(text=rodape_da_comparacao(mais_rapido, latencia))
+        return embed
+
+    async def atualizar():
+        try:
+            await mensagem.edit(embed=montar_embed())
+        except discord.HTTPException as e:
+            # Embed recusado pelo Discord: mostra ao menos o estado de cada modelo em texto
+            print(f"Erro ao atualizar o /compare: {str(e)}")
+            linhas = [f"**{nome}**: {resumo_do_resultado(resultados.get(nome))}" for nome in nomes]
+            try:
+                await mensagem.edit(content="\n".join(linhas)[:MAX_MESSAGE_LENGTH], embed=None)
+            except discord.HTTPException as e:
+                print(f"Erro ao atualizar o /compare: {str(e)}")
+
+    mensagem = await interaction.followup.send(embed=montar_embed(), wait=True)
+    prazo = time.monotonic() + COMPARE_DEADLINE
+    ultima_edicao = time.monotonic()
+    edicao_pendente = False
+    pendentes = set(tarefas)
     try:
-        # Registra uso
-        await db.log_usage(canal, interaction.user.id, "code")
-        
-        # Recupera configurações do canal
-        settings = await db.get_channel_settings(canal)
-        historico = await db.get_message_history(canal) if settings["continuous_mode"] else []
-        
-        historico.append({"role": "user", "content": pergunta})
-        response = get_ai_response(historico, canal)
-        historico.append({"role": "assistant", "content": response})
-        
-        # Salva histórico se modo contínuo estiver ativo
-        if settings["continuous_mode"]:
-            await db.save_message_history(canal, historico)
-        
-        await interaction.followup.send(f"```markdown\n{response}\n```")
-    except Exception as e:
-        print(f"Erro ao processar código: {str(e)}")
-        await interaction.followup.send(
-            "Desculpe, ocorreu um erro ao processar sua solicitação de código. Tente novamente mais tarde."
-        )
+        while pendentes:
+            agora = time.monotonic()
+            if agora >= prazo:
+                break
+            espera = prazo - agora
+            if edicao_pendente:
+                espera = min(espera, max(0.0, ultima_edicao + COMPARE_EDIT_INTERVAL - agora))
+            prontas, pendentes = await asyncio.wait(pendentes, timeout=espera, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in prontas:
+                resultados[tarefas[tarefa]] = tarefa.exception() or tarefa.result()
+                edicao_pendente = True
+            if edicao_pendente and pendentes and time.monotonic() - ultima_edicao >= COMPARE_EDIT_INTERVAL:
+                await atualizar()
+                ultima_edicao = time.monotonic()
+                edicao_pendente = False
+    finally:
+        # Passou do prazo (ou o comando foi cancelado): cancela as chamadas que ainda não voltaram
+        for tarefa in pendentes:
+            tarefa.cancel()
+            resultados[tarefas[tarefa]] = asyncio.CancelledError()
+    await atualizar()
 
 @tree.command(name="stats", description="Mostra estatísticas de uso do canal")
 async def stats(interaction: discord.Interaction):
@@ -321,4 +778,77 @@ async def stats(interaction: discord.Interaction):
     
     await interaction.response.send_message(embed=embed)
 
-bot.run(TOKEN)
+def coletar_metricas():
+    """Atualiza os gauges do pool e do agendador antes de cada leitura das métricas"""
+    for estado, valor in db.pool_stats().items():
+        DB_POOL.set(valor, state=estado)
+    for campo, valor in llm_scheduler.snapshot().items():
+        if isinstance(valor, (int, float)):
+            SCHEDULER.set(valor, field=campo)
+
+telemetry.registry.on_collect(coletar_metricas)
+
+def formatar_latencias(histograma, label: str, **filtro) -> str:
+    """Linhas "valor: p50 / p95 (n)" de um histograma agrupado por um label"""
+    linhas = []
+    for valor in histograma.label_values(label):
+        n = histograma.count(**{label: valor}, **filtro)
+        if not n:
+            continue
+        p50 = histograma.quantile(0.5, **{label: valor}, **filtro)
+        p95 = histograma.quantile(0.95, **{label: valor}, **filtro)
+        linhas.append(f"`{valor}`: {p50 * 1000:.0f} / {p95 * 1000:.0f} ms ({n})")
+    return "\n".join(linhas)[:1024] or "Sem dados ainda."
+
+@tree.command(name="perf", description="Mostra métricas de desempenho do bot (administradores)")
+@app_commands.default_permissions(administrator=True)
+async def perf(interaction: discord.Interaction):
+    telemetry.registry.collect()
+    embed = discord.Embed(
+        title="⏱️ Desempenho",
+        description="Latências p50 / p95 (número de amostras) desde o início do processo.",
+        color=discord.Color.dark_teal()
+    )
+    embed.add_field(name="Comandos", value=formatar_latencias(COMMAND_SECONDS, "command"), inline=False)
+    embed.add_field(name="Etapas", value=formatar_latencias(STAGE_SECONDS, "stage"), inline=False)
+    embed.add_field(name="Modelos (resposta completa)", value=formatar_latencias(LLM_SECONDS, "model", mode="complete"), inline=False)
+    embed.add_field(name="Modelos (primeiro trecho)", value=formatar_latencias(LLM_SECONDS, "model", mode="first_token"), inline=False)
+    embed.add_field(name="Banco de dados", value=formatar_latencias(telemetry.DB_SECONDS, "method"), inline=False)
+
+    tokens = {}
+    for chave, valor in LLM_TOKENS.values.items():
+        tokens[dict(chave)["kind"]] = tokens.get(dict(chave)["kind"], 0) + valor
+    pool = db.pool_stats()
+    agendador = llm_scheduler.snapshot()
+    admissoes = {dict(chave)["decision"]: valor for chave, valor in ADMISSION.values.items()}
+    conversas = db.conversation_cache_stats()
+    memoria = ""
+    if memoria_longa is not None:
+        indices = memoria_longa.stats()
+        memoria = (f"🧠 Memória de longo prazo: {indices['channels']} canais, {indices['turns']} turnos, "
+                   f"{indices['bytes'] / 2**20:.1f} MB\n")
+    embed.add_field(
+        name="Recursos",
+        value=(
+            f"🗄️ Pool: {pool['in_use']} em uso / {pool['size']} abertas (máx. {pool['max']})\n"
+            f"🚦 Agendador: {agendador['in_flight']} em andamento, {agendador['queue_depth']} na fila "
+            f"(espera p95 {agendador['wait_p95'] * 1000:.0f} ms)\n"
+            f"💬 Conversas em memória: {conversas['channels']} canais, {conversas['bytes'] / 2**20:.1f} MB "
+            f"({conversas['hit_rate']:.0%} de acerto)\n"
+            f"{memoria}"
+            f"🛂 Admissão: {admissoes.get('downgrade', 0):.0f} rebaixadas, {admissoes.get('refuse', 0):.0f} recusadas, "
+            f"{admissoes.get('superseded', 0):.0f} substituídas, {admissoes.get('deadline', 0):.0f} fora do prazo\n"
+            f"🔤 Tokens: {tokens.get('prompt', 0):.0f} de prompt, {tokens.get('completion', 0):.0f} de resposta"
+        ),
+        inline=False
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def main():
+    if not TOKEN or not OPENROUTER_API_KEY:
+        raise ValueError("DISCORD_TOKEN e OPENROUTER_API_KEY são necessários no arquivo .env")
+    bot.run(TOKEN)
+
+# Importar este módulo (ex: nos benchmarks em bench/) não inicia o bot
+if __name__ == "__main__":
+    main()
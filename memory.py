@@ -0,0 +1,483 @@
+import os
+import re
+import zlib
+import math
+import asyncio
+import logging
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Memória de longo prazo do modo contínuo: turnos antigos indexados com TF-IDF sobre termos com hash
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "20000"))  # Turnos indexados por canal (os mais antigos saem)
+MEMORY_MAX_TOTAL_TURNS = int(os.getenv("MEMORY_MAX_TOTAL_TURNS", "60000"))  # Total em memória (~2 KB por turno); canais menos usados são descartados
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))  # Trechos recuperados por pergunta
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.2"))  # Similaridade mínima (cosseno) para um trecho entrar
+MEMORY_SNIPPET_CHARS = 600  # Tamanho máximo de cada trecho guardado
+MEMORY_TERMS_PER_TURN = int(os.getenv("MEMORY_TERMS_PER_TURN", "64"))  # Termos de maior peso mantidos por turno (os comuns, de peso baixo, saem)
+MEMORY_MERGE_TURNS = 256  # Turnos novos acumulados antes de serem incorporados ao índice compacto (em outra thread)
+
+_WORD_RE = re.compile(r"\w{2,}")
+_BUILD_CHUNK = 1000  # Turnos processados por vez na montagem do índice
+
+
+def _features(text: str) -> Counter:
+    """Contagem dos hashes (32 bits) das palavras e pares de palavras de um texto"""
+    words = _WORD_RE.findall(text.lower())
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return Counter(zlib.crc32(term.encode("utf-8")) for term in terms)
+
+
+def _idf(n_docs: int, df):
+    return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+
+class _Segment:
+    """Índice invertido imutável em formato CSR
+
+    Os hashes dos termos ficam ordenados em `terms`; as entradas do termo
+    i são docs[offsets[i]:offsets[i + 1]] e os pesos correspondentes. São
+    quatro arrays contíguos no total, em vez de dois arrays por termo.
+    """
+
+    __slots__ = ("terms", "offsets", "docs", "weights")
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray):
+        self.terms = terms  # uint32, ordenados e sem repetição
+        self.offsets = offsets  # int64, len(terms) + 1
+        self.docs = docs  # int32, crescentes dentro de cada termo
+        self.weights = weights  # float32
+
+    @classmethod
+    def from_postings(cls, terms: np.ndarray, docs: np.ndarray, weights: np.ndarray) -> "_Segment":
+        """Monta o segmento a partir de entradas (termo, doc, peso) em qualquer ordem"""
+        order = np.lexsort((docs, terms))
+        terms = terms[order]
+        unique, starts = np.unique(terms, return_index=True)
+        offsets = np.append(starts, len(terms)).astype(np.int64)
+        return cls(unique, offsets, docs[order], weights[order])
+
+    def locate(self, terms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Início e fim das entradas de cada termo (início == fim para termos ausentes)"""
+        index = np.searchsorted(self.terms, terms)
+        found = index < len(self.terms)
+        found[found] = self.terms[index[found]] == terms[found]
+        index = np.where(found, index, 0)
+        starts = np.where(found, self.offsets[index], 0)
+        ends = np.where(found, self.offsets[np.minimum(index + 1, len(self.offsets) - 1)], 0)
+        return starts, ends
+
+    def expanded(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return np.repeat(self.terms, np.diff(self.offsets)), self.docs, self.weights
+
+    @property
+    def nbytes(self) -> int:
+        return self.terms.nbytes + self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes
+
+
+class _Tail:
+    """Turnos indexados depois da última compactação, em listas Python (baratas de acrescentar)"""
+
+    __slots__ = ("postings", "seen", "size")
+
+    def __init__(self):
+        self.postings: Dict[int, Tuple[array, array]] = {}
+        self.seen: Counter = Counter()  # Turnos com cada termo, inclusive os podados
+        self.size = 0
+
+    def add(self, doc: int, weights: Dict[int, float], terms):
+        self.seen.update(terms)
+        for term, weight in weights.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("i"), array("f"))
+            entry[0].append(doc)
+            entry[1].append(weight)
+        self.size += 1
+
+    def absorb(self, newer: "_Tail"):
+        """Acrescenta as entradas de uma cauda mais nova"""
+        for term, (docs, weights) in newer.postings.items():
+            entry = self.postings.setdefault(term, (array("i"), array("f")))
+            entry[0].extend(docs)
+            entry[1].extend(weights)
+        self.seen.update(newer.seen)
+        self.size += newer.size
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        terms = np.repeat(
+            np.fromiter(self.postings.keys(), np.uint32, len(self.postings)),
+            [len(docs) for docs, _ in self.postings.values()]
+        )
+        docs = np.frombuffer(b"".join(docs.tobytes() for docs, _ in self.postings.values()), np.int32)
+        weights = np.frombuffer(b"".join(weights.tobytes() for _, weights in self.postings.values()), np.float32)
+        return terms, docs, weights
+
+
+def _count_terms(terms: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Soma as contagens de termos repetidos e mantém só os que aparecem em mais de um turno
+
+    Os termos de um turno só (a maioria dos pares de palavras) ficam de
+    fora: quase sempre sobrevivem à poda e são contados pelas entradas.
+    """
+    unique, inverse = np.unique(terms, return_inverse=True)
+    totals = np.bincount(inverse, counts).astype(np.int32)
+    common = totals > 1
+    return unique[common], totals[common]
+
+
+def _merge(parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], first_doc: int) -> _Segment:
+    """Junta entradas (termos, docs, pesos) num segmento, sem as de turnos anteriores a first_doc"""
+    terms, docs, weights = (np.concatenate(arrays) for arrays in zip(*parts))
+    live = docs >= first_doc
+    return _Segment.from_postings(terms[live], docs[live], weights[live])
+
+
+def _compact(segments: List[_Segment], tail: _Tail, first_doc: int,
+             df: Tuple[np.ndarray, np.ndarray]) -> Tuple[List[_Segment], Tuple[np.ndarray, np.ndarray]]:
+    """Transforma a cauda num segmento e junta os segmentos de tamanho parecido
+
+    Como num contador binário, um segmento só é reescrito quando outro
+    de tamanho comparável chega atrás dele: cada entrada é copiada
+    O(log n) vezes ao todo, em vez de a cada compactação. As contagens
+    da cauda entram na tabela de frequências.
+    """
+    seen = np.fromiter(tail.seen.keys(), np.uint32, len(tail.seen))
+    df = _count_terms(np.concatenate((df[0], seen)), np.concatenate((df[1], np.fromiter(tail.seen.values(), np.int32, len(seen)))))
+    segments = [segment for segment in segments if segment.docs.size and segment.docs.max() >= first_doc]
+    segments.append(_merge([tail.arrays()], first_doc))
+    while len(segments) > 1 and segments[-2].docs.size <= 2 * segments[-1].docs.size:
+        newer = segments.pop()
+        segments[-1] = _merge([segments[-1].expanded(), newer.expanded()], first_doc)
+    return segments, df
+
+
+class ChannelIndex:
+    """Índice TF-IDF esparso dos turnos de um canal
+
+    Cada turno (pergunta + resposta) vira um vetor TF-IDF do qual só ficam
+    os MEMORY_TERMS_PER_TURN termos de maior peso, normalizado depois do
+    corte: palavras comuns, que quase não mudam a similaridade, são as que
+    mais ocupariam memória e tempo de busca. O IDF vem de uma tabela à
+    parte com a frequência real de cada termo, para a poda não fazer
+    palavras comuns parecerem raras na pergunta. O grosso do índice é um
+    _Segment CSR imutável, montado fora do event loop (build e compact
+    rodam em outra thread); turnos novos entram numa cauda pequena até
+    virar um segmento novo, e segmentos de tamanho parecido são juntados.
+    A busca só lê as entradas dos termos da pergunta e soma as
+    contribuições com um único np.bincount.
+    """
+
+    def __init__(self, max_turns: int = MEMORY_MAX_TURNS):
+        self.max_turns = max_turns
+        self.segments: List[_Segment] = []  # Do mais antigo (e maior) para o mais novo
+        self.tail = _Tail()
+        self.merging: Optional[_Tail] = None  # Cauda sendo incorporada ao segmento (ainda consultada)
+        self.first_doc = 0  # ID do turno mais antigo ainda indexado (IDs crescem sem reaproveitar)
+        self.df: Tuple[np.ndarray, np.ndarray] = (np.empty(0, np.uint32), np.empty(0, np.int32))  # Termos ordenados e em quantos turnos já apareceram
+        self.seqs = np.zeros(64, dtype=np.int64)  # Crescentes: seq da pergunta de cada turno vivo
+        self.snippets: List[str] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def last_seq(self) -> int:
+        return int(self.seqs[self.count - 1]) if self.count else 0
+
+    @property
+    def indexed(self) -> int:
+        """Turnos já indexados, inclusive os descartados (a base da tabela de frequências)"""
+        return self.first_doc + self.count
+
+    @property
+    def nbytes(self) -> int:
+        return (sum(segment.nbytes for segment in self.segments) + self.df[0].nbytes + self.df[1].nbytes
+                + self.seqs.nbytes + sum(len(snippet) for snippet in self.snippets))
+
+    @classmethod
+    def build(cls, pairs: List[Tuple[int, Dict[str, str], Dict[str, str]]], max_turns: int = MEMORY_MAX_TURNS) -> "ChannelIndex":
+        """Monta o índice de uma vez a partir de turnos [(seq, pergunta, resposta), ...] em ordem de seq
+
+        Custa alguns segundos em canais longos: chame com asyncio.to_thread.
+        """
+        index = cls(max_turns)
+        terms, counts, lengths = array("I"), array("H"), array("i")
+        for seq, question, answer in pairs[-max_turns:]:
+            features = _features(turn_text(question, answer))
+            if not features or seq <= index.last_seq:
+                continue
+            terms.extend(features.keys())
+            counts.extend(min(count, 65535) for count in features.values())
+            lengths.append(len(features))
+            index._append_doc(seq, snippet_of(question, answer))
+        if not index.count:
+            return index
+
+        terms = np.frombuffer(terms, np.uint32)
+        counts = np.frombuffer(counts, np.uint16)
+        lengths = np.frombuffer(lengths, np.int32)
+        unique, df = np.unique(terms, return_counts=True)
+        idf = _idf(index.count, df).astype(np.float32)
+        common = df > 1
+        index.df = (unique[common], df[common].astype(np.int32))
+        bounds = np.concatenate(([0], np.cumsum(lengths)))
+
+        # Pesos e poda em blocos de turnos: os temporários ficam do tamanho do bloco, não do histórico inteiro
+        kept = []
+        for first in range(0, index.count, _BUILD_CHUNK):
+            last = min(first + _BUILD_CHUNK, index.count)
+            chunk_terms = terms[bounds[first]:bounds[last]]
+            docs = np.repeat(np.arange(first, last, dtype=np.int32), lengths[first:last])
+            weights = (1.0 + np.log(counts[bounds[first]:bounds[last]].astype(np.float32))) * idf[np.searchsorted(unique, chunk_terms)]
+            # Só os MEMORY_TERMS_PER_TURN termos de maior peso de cada turno, normalizados depois do corte
+            order = np.lexsort((-weights, docs))
+            rank = np.arange(len(order)) - (bounds[docs[order]] - bounds[first])
+            keep = order[rank < MEMORY_TERMS_PER_TURN]
+            docs, weights = docs[keep], weights[keep]
+            weights /= np.sqrt(np.bincount(docs - first, weights * weights))[docs - first].astype(np.float32)
+            kept.append((chunk_terms[keep], docs, weights))
+        del terms, counts, unique, df, idf, common, chunk_terms  # Liberados antes da junção final
+        index.segments = [_merge(kept, 0)]
+        return index
+
+    def _append_doc(self, seq: int, snippet: str):
+        if self.count == len(self.seqs):
+            self.seqs = np.resize(self.seqs, self.count * 2)
+        self.seqs[self.count] = seq
+        self.snippets.append(snippet[:MEMORY_SNIPPET_CHARS])
+        self.count += 1
+
+    def _locate(self, terms: np.ndarray) -> Tuple[List[Tuple[_Segment, np.ndarray, np.ndarray]], np.ndarray]:
+        """Entradas de cada termo em cada segmento e em quantos turnos já indexados cada termo aparece"""
+        located = [(segment, *segment.locate(terms)) for segment in self.segments]
+        df = np.zeros(len(terms), np.int64)
+        for _, starts, ends in located:
+            df += ends - starts
+        # A tabela conta também as ocorrências podadas; as entradas cobrem os termos de um turno só
+        known, counts = self.df
+        if len(known):
+            index = np.minimum(np.searchsorted(known, terms), len(known) - 1)
+            df = np.maximum(df, np.where(known[index] == terms, counts[index], 0))
+        for tail in (self.merging, self.tail):
+            if tail is not None and tail.size:
+                df += np.fromiter((tail.seen.get(term, 0) for term in terms.tolist()), np.int64, len(terms))
+        return located, df
+
+    def add(self, seq: int, text: str, snippet: str):
+        """Indexa um turno (seq precisa ser maior que o do último turno indexado)"""
+        if seq <= self.last_seq:
+            return
+        features = _features(text)
+        if not features:
+            return
+        if self.count == self.max_turns:
+            self._drop_oldest(self.max_turns // 10 or 1)
+
+        terms = np.fromiter(features.keys(), np.uint32, len(features))
+        counts = np.fromiter(features.values(), np.float64, len(features))
+        weights = (1.0 + np.log(counts)) * _idf(self.indexed, self._locate(terms)[1])
+        if len(weights) > MEMORY_TERMS_PER_TURN:
+            top = np.argpartition(weights, len(weights) - MEMORY_TERMS_PER_TURN)[-MEMORY_TERMS_PER_TURN:]
+            terms, weights = terms[top], weights[top]
+        weights /= math.sqrt(float(np.dot(weights, weights)))
+        self.tail.add(self.first_doc + self.count, dict(zip(terms.tolist(), weights.tolist())), features.keys())
+        self._append_doc(seq, snippet)
+
+    def _drop_oldest(self, n: int):
+        """Descarta os n turnos mais antigos (suas entradas saem na próxima compactação)"""
+        self.seqs[:self.count - n] = self.seqs[n:self.count]
+        del self.snippets[:n]
+        self.count -= n
+        self.first_doc += n
+
+    def needs_compaction(self) -> bool:
+        return self.merging is None and self.tail.size >= MEMORY_MERGE_TURNS
+
+    async def compact(self):
+        """Transforma a cauda em segmento CSR em outra thread (a busca continua usando a cauda até o fim)"""
+        if self.merging is not None or not self.tail.size:
+            return
+        self.merging, self.tail = self.tail, _Tail()
+        try:
+            self.segments, self.df = await asyncio.to_thread(_compact, list(self.segments), self.merging, self.first_doc, self.df)
+        except Exception as e:
+            logging.error(f"Erro ao compactar memória do canal: {str(e)}")
+            self.merging.absorb(self.tail)
+            self.tail = self.merging
+        finally:
+            self.merging = None
+
+    def search(self, query: str, before_seq: int, k: int = MEMORY_TOP_K,
+               min_score: float = MEMORY_MIN_SCORE) -> List[Tuple[float, int, str]]:
+        """Turnos mais parecidos com a pergunta entre os anteriores a `before_seq`
+
+        Returns:
+            Lista [(similaridade, seq, trecho), ...] em ordem cronológica
+        """
+        n = int(np.searchsorted(self.seqs[:self.count], before_seq))
+        features = _features(query)
+        if n == 0 or k <= 0 or not features:
+            return []
+
+        terms = np.fromiter(features.keys(), np.uint32, len(features))
+        counts = np.fromiter(features.values(), np.float64, len(features))
+        located, df = self._locate(terms)
+        query_weights = (1.0 + np.log(counts)) * _idf(self.indexed, df)
+        query_norm = math.sqrt(float(np.dot(query_weights, query_weights)))
+
+        # Junta as entradas de todos os termos e multiplica pelo peso de cada termo na pergunta de uma vez
+        docs, weights, factors, lengths = [], [], [], []
+        for segment, starts, ends in located:
+            for start, end, weight in zip(starts.tolist(), ends.tolist(), query_weights.tolist()):
+                if end > start:
+                    docs.append(segment.docs[start:end])
+                    weights.append(segment.weights[start:end])
+                    factors.append(weight)
+                    lengths.append(end - start)
+        for tail in (self.merging, self.tail):
+            if tail is None or not tail.size:
+                continue
+            for term, weight in zip(features.keys(), query_weights.tolist()):
+                entry = tail.postings.get(term)
+                if entry is not None:
+                    docs.append(np.frombuffer(entry[0], np.int32))
+                    weights.append(np.frombuffer(entry[1], np.float32))
+                    factors.append(weight)
+                    lengths.append(len(entry[0]))
+        if not docs:
+            return []
+
+        docs = np.concatenate(docs) - np.int32(self.first_doc)
+        weights = np.concatenate(weights) * np.repeat(np.array(factors, np.float32), lengths)
+        live = (docs >= 0) & (docs < n)  # Turnos descartados (ainda no segmento) e posteriores a before_seq
+        if not live.all():
+            docs, weights = docs[live], weights[live]
+        scores = np.bincount(docs, weights, minlength=n) / query_norm
+
+        # Filtra antes de ordenar: o argpartition sobre milhares de zeros custaria mais que a busca inteira
+        chosen = np.flatnonzero(scores >= min_score)
+        if len(chosen) > k:
+            chosen = np.sort(chosen[np.argpartition(scores[chosen], len(chosen) - k)[-k:]])
+        return [(float(scores[i]), int(self.seqs[i]), self.snippets[i]) for i in chosen.tolist()]
+
+
+def pair_turns(turns: List[Tuple[int, Dict[str, str]]]) -> List[Tuple[int, Dict[str, str], Dict[str, str]]]:
+    """Agrupa o histórico em turnos (seq da pergunta, pergunta, resposta)"""
+    pairs = []
+    for (seq, message), (_, reply) in zip(turns, turns[1:]):
+        if message.get("role") == "user" and reply.get("role") == "assistant":
+            pairs.append((seq, message, reply))
+    return pairs
+
+
+def snippet_of(question: Dict[str, str], answer: Dict[str, str]) -> str:
+    return f"Usuário: {question.get('content', '')}\nKurama: {answer.get('content', '')}"
+
+
+def turn_text(question: Dict[str, str], answer: Dict[str, str]) -> str:
+    return f"{question.get('content', '')} {answer.get('content', '')}"
+
+
+class LongTermMemory:
+    """Índices de memória de longo prazo por canal, com LRU entre canais
+
+    O índice de um canal é montado a partir do histórico no banco na
+    primeira vez que é pedido, em outra thread; até ficar pronto a busca
+    não retorna nada, para nunca atrasar a resposta.
+    """
+
+    def __init__(self, db, max_turns: int = MEMORY_MAX_TOTAL_TURNS):
+        """Inicializa a memória
+
+        Args:
+            db: Instância de Database (fonte do histórico)
+            max_turns: Total de turnos indexados somando todos os canais
+        """
+        self.db = db
+        self.max_turns = max_turns
+        self._indexes: "OrderedDict[int, ChannelIndex]" = OrderedDict()
+        self._loading: Dict[int, List[Tuple[int, str, str]]] = {}  # Turnos que chegaram durante a carga
+        self._tasks = set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _touch(self, channel_id: int) -> Optional[ChannelIndex]:
+        index = self._indexes.get(channel_id)
+        if index is not None:
+            self._indexes.move_to_end(channel_id)
+        elif channel_id not in self._loading:
+            self._loading[channel_id] = []
+            self._spawn(self._load(channel_id))
+        return index
+
+    async def _load(self, channel_id: int):
+        """Monta o índice de um canal com o histórico guardado no banco"""
+        index = ChannelIndex()
+        try:
+            turns = await self.db.get_history_turns(channel_id, MEMORY_MAX_TURNS * 2)
+            index = await asyncio.to_thread(ChannelIndex.build, pair_turns(turns))
+        except Exception as e:
+            logging.error(f"Erro ao carregar memória do canal: {str(e)}")
+        pending = self._loading.pop(channel_id, None)
+        if pending is None:
+            return  # Esquecido (/resetmemoria) durante a carga
+        for seq, text, snippet in pending:
+            index.add(seq, text, snippet)
+        self._indexes[channel_id] = index
+        self._evict()
+
+    def _evict(self):
+        total = sum(len(index) for index in self._indexes.values())
+        while total > self.max_turns and len(self._indexes) > 1:
+            _, index = self._indexes.popitem(last=False)
+            total -= len(index)
+
+    def recall(self, channel_id: int, query: str, before_seq: int, k: int = MEMORY_TOP_K) -> List[str]:
+        """Trechos de conversas antigas do canal relevantes para a pergunta
+
+        Args:
+            channel_id: ID do canal do Discord
+            query: Pergunta atual
+            before_seq: Só considera turnos anteriores a esta posição (fora da janela recente)
+            k: Número máximo de trechos
+
+        Returns:
+            Trechos em ordem cronológica (vazio enquanto o índice do canal carrega)
+        """
+        index = self._touch(channel_id)
+        if index is None:
+            return []
+        return [snippet for _, _, snippet in index.search(query, before_seq, k)]
+
+    def remember(self, channel_id: int, seq: int, question: Dict[str, str], answer: Dict[str, str]):
+        """Indexa um turno recém-gravado"""
+        text = turn_text(question, answer)
+        snippet = snippet_of(question, answer)
+        if channel_id in self._loading:
+            self._loading[channel_id].append((seq, text, snippet))
+            return
+        index = self._indexes.get(channel_id)
+        if index is not None:
+            index.add(seq, text, snippet)
+            if index.needs_compaction():
+                self._spawn(index.compact())
+            self._evict()
+
+    def forget(self, channel_id: int):
+        """Descarta a memória de um canal"""
+        self._indexes.pop(channel_id, None)
+        self._loading.pop(channel_id, None)
+
+    def stats(self) -> dict:
+        """Canais e turnos indexados e bytes ocupados pelos índices"""
+        return {
+            "channels": len(self._indexes),
+            "turns": sum(len(index) for index in self._indexes.values()),
+            "bytes": sum(index.nbytes for index in self._indexes.values()),
+        }
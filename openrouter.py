@@ -0,0 +1,195 @@
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
+from telemetry import record_usage
+from codec import ChatBodyEncoder, loads
+
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Limites do pool de conexões HTTP
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "32"))  # Conexões simultâneas no total
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "16"))  # Conexões simultâneas por host
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "60"))  # Segundos que uma conexão ociosa fica aberta
+
+# Timeouts por requisição (em segundos)
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "5"))
+STREAM_READ_TIMEOUT = float(os.getenv("STREAM_READ_TIMEOUT", "30"))  # Tempo máximo sem receber nenhum byte no streaming
+
+
+class OpenRouterError(Exception):
+    """Erro ao se comunicar com a API do OpenRouter"""
+
+
+class OpenRouterResponseError(OpenRouterError):
+    """Resposta do OpenRouter em formato inesperado"""
+
+
+class OpenRouterRateLimitError(OpenRouterError):
+    """O OpenRouter recusou a requisição por excesso de uso (HTTP 429)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Segundos indicados no cabeçalho Retry-After, se houver
+
+
+def _check_rate_limited(response: aiohttp.ClientResponse):
+    """Levanta OpenRouterRateLimitError se a resposta for um 429"""
+    if response.status != 429:
+        return
+    retry_after = None
+    try:
+        retry_after = float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        pass
+    raise OpenRouterRateLimitError("Erro na API: limite de requisições do OpenRouter atingido (429)", retry_after)
+
+
+class OpenRouterClient:
+    """Cliente assíncrono da API do OpenRouter
+
+    Mantém uma única sessão HTTP (com keep-alive e pool limitado) durante
+    toda a vida do bot, para que várias chamadas simultâneas não bloqueiem
+    o event loop do discord.py nem paguem um novo handshake TLS a cada vez.
+    """
+
+    def __init__(self, api_key: str):
+        """Inicializa o cliente
+
+        Args:
+            api_key: Chave da API do OpenRouter
+        """
+        self.api_key = api_key
+        self.session: Optional[aiohttp.ClientSession] = None  # Sessão HTTP compartilhada
+        self._bodies = ChatBodyEncoder()  # System prompt e turnos já codificados, reaproveitados entre requisições
+
+    async def start(self):
+        """Cria a sessão HTTP compartilhada (idempotente)"""
+        if self.session is not None and not self.session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, sock_connect=CONNECT_TIMEOUT),
+        )
+        logging.info("Sessão HTTP do OpenRouter criada")
+
+    async def close(self):
+        """Fecha a sessão HTTP compartilhada"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float] = None) -> str:
+        """Envia uma conversa ao modelo e retorna a resposta completa
+
+        Args:
+            model: ID do modelo no OpenRouter
+            messages: Lista de mensagens no formato [{"role": str, "content": str}, ...]
+            timeout: Timeout total da requisição em segundos (padrão: REQUEST_TIMEOUT)
+
+        Returns:
+            Conteúdo da resposta do modelo
+
+        Raises:
+            OpenRouterError: Se a requisição falhar
+            OpenRouterRateLimitError: Se o OpenRouter responder 429
+            OpenRouterResponseError: Se a resposta vier em formato inválido
+        """
+        content, _ = await self.chat(model, messages, timeout)
+        return content
+
+    async def chat(self, model: str, messages: List[Dict[str, str]],
+                   timeout: Optional[float] = None) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Como complete(), mas também retorna a contagem de tokens informada pelo OpenRouter
+
+        Args:
+            model: ID do modelo no OpenRouter
+            messages: Lista de mensagens no formato [{"role": str, "content": str}, ...]
+            timeout: Timeout total da requisição em segundos (padrão: REQUEST_TIMEOUT)
+
+        Returns:
+            Tupla (conteúdo da resposta, campo usage ou None)
+
+        Raises:
+            OpenRouterError: Se a requisição falhar
+            OpenRouterRateLimitError: Se o OpenRouter responder 429
+            OpenRouterResponseError: Se a resposta vier em formato inválido
+        """
+        await self.start()
+        body = self._bodies.body(model, messages)
+        request_timeout = aiohttp.ClientTimeout(total=timeout or REQUEST_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+
+        try:
+            async with self.session.post(OPENROUTER_URL, data=body, timeout=request_timeout) as response:
+                _check_rate_limited(response)
+                response.raise_for_status()
+                data = loads(await response.read())
+                record_usage(model, data.get('usage'))
+                return data['choices'][0]['message']['content'], data.get('usage')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise OpenRouterError(f"Erro na API: {str(e) or type(e).__name__}") from e
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise OpenRouterResponseError(f"Erro ao processar resposta: {str(e)}") from e
+
+    async def stream(self, model: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Envia uma conversa ao modelo com `stream: true` e produz os trechos da resposta
+
+        Args:
+            model: ID do modelo no OpenRouter
+            messages: Lista de mensagens no formato [{"role": str, "content": str}, ...]
+
+        Yields:
+            Trechos de texto na ordem em que chegam (Server-Sent Events)
+
+        Raises:
+            OpenRouterError: Se a requisição falhar ou o servidor enviar um erro no meio do stream
+            OpenRouterRateLimitError: Se o OpenRouter responder 429
+            OpenRouterResponseError: Se um evento vier em formato inválido
+        """
+        await self.start()
+        # O último evento traz a contagem de tokens
+        body = self._bodies.body(model, messages, stream=True, usage={"include": True})
+        # Sem limite total: respostas longas podem levar mais que REQUEST_TIMEOUT,
+        # o que importa é o servidor continuar mandando dados
+        request_timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=STREAM_READ_TIMEOUT)
+
+        try:
+            async with self.session.post(OPENROUTER_URL, data=body, timeout=request_timeout) as response:
+                _check_rate_limited(response)
+                response.raise_for_status()
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    # Linhas vazias separam eventos e linhas com ":" são comentários (keep-alive)
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        return
+
+                    event = loads(payload)
+                    if "error" in event:
+                        raise OpenRouterError(f"Erro na API: {event['error'].get('message', event['error'])}")
+                    record_usage(model, event.get("usage"))
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise OpenRouterError(f"Erro na API: {str(e) or type(e).__name__}") from e
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise OpenRouterResponseError(f"Erro ao processar resposta: {str(e)}") from e
@@ -0,0 +1,116 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class MemoryRateLimitBackend:
+    """Token bucket em memória, com estado O(1) por chave
+
+    Cada chave guarda apenas (tokens, instante da última atualização). Um
+    bucket que ficou ocioso tempo suficiente para encher de novo é
+    equivalente a um bucket inexistente, então é descartado.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        """Inicializa o backend
+
+        Args:
+            max_keys: Número máximo de buckets mantidos em memória
+        """
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # {chave: (tokens, atualizado_em, cheio_em)}, do menos ao mais recente
+
+    async def acquire(self, key: str, capacity: int, window: float) -> bool:
+        """Consome um token do bucket de uma chave
+
+        Args:
+            key: Identificador do bucket
+            capacity: Número máximo de requisições na janela
+            window: Janela de tempo em segundos
+
+        Returns:
+            True se havia token disponível, False caso contrário
+        """
+        now = time.monotonic()
+        rate = capacity / window
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = float(capacity)
+        else:
+            tokens = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        self._buckets.move_to_end(key)
+        self._evict(now)
+        return allowed
+
+    def _evict(self, now: float):
+        """Descarta buckets que já voltaram a ficar cheios ou excedem max_keys"""
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class PostgresRateLimitBackend:
+    """Token bucket compartilhado entre réplicas, guardado no Postgres
+
+    Cada verificação é um único UPSERT ... RETURNING atômico (veja
+    Database.take_rate_limit_token).
+    """
+
+    def __init__(self, db):
+        """Inicializa o backend
+
+        Args:
+            db: Instância de Database
+        """
+        self.db = db
+
+    async def acquire(self, key: str, capacity: int, window: float) -> bool:
+        """Consome um token do bucket de uma chave (mesma interface do backend em memória)"""
+        return await self.db.take_rate_limit_token(key, capacity, window)
+
+
+class RateLimiter:
+    """Aplica limites de requisição por usuário e comando e, opcionalmente, por servidor"""
+
+    def __init__(self, backend, default: Dict, per_command: Optional[Dict[str, Dict]] = None, per_guild: Optional[Dict] = None):
+        """Inicializa o rate limiter
+
+        Args:
+            backend: MemoryRateLimitBackend ou PostgresRateLimitBackend
+            default: Limite padrão no formato {"window": segundos, "max_requests": int}
+            per_command: Limites específicos por comando, no mesmo formato
+            per_guild: Limite total de cada servidor (somando todos os usuários), ou None
+        """
+        self.backend = backend
+        self.default = default
+        self.per_command = per_command or {}
+        self.per_guild = per_guild
+
+    async def check(self, user_id: int, command: str, guild_id: Optional[int] = None) -> bool:
+        """Verifica se uma requisição pode ser atendida e a contabiliza
+
+        Args:
+            user_id: ID do usuário
+            command: Nome do comando
+            guild_id: ID do servidor (None em mensagens diretas)
+
+        Returns:
+            True se a requisição está dentro dos limites, False caso contrário
+        """
+        limit = self.per_command.get(command, self.default)
+        if not await self.backend.acquire(f"user:{user_id}:{command}", limit["max_requests"], limit["window"]):
+            return False
+
+        if guild_id is not None and self.per_guild:
+            return await self.backend.acquire(f"guild:{guild_id}", self.per_guild["max_requests"], self.per_guild["window"])
+        return True
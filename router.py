@@ -0,0 +1,328 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from openrouter import OpenRouterRateLimitError
+from telemetry import LLM_ERRORS, LLM_SECONDS
+
+# Fallbacks usados quando o modelo do canal demora ou falha (IDs do OpenRouter, separados por vírgula)
+FALLBACK_MODELS = [
+    m.strip() for m in os.getenv("FALLBACK_MODELS", "meta-llama/llama-3-8b-instruct,mistral/mistral-7b-instruct").split(",")
+    if m.strip()
+]
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8"))  # Espera antes do hedge enquanto não há amostras suficientes
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))  # Nunca dispara o hedge antes disso
+HEDGE_PERCENTILE = 95  # Dispara o hedge quando o modelo passa deste percentil de latência
+MAX_ATTEMPTS = int(os.getenv("MAX_MODEL_ATTEMPTS", "2"))  # Modelos tentados por requisição (principal + fallbacks)
+EJECT_AFTER_FAILURES = int(os.getenv("EJECT_AFTER_FAILURES", "3"))  # Falhas seguidas até ejetar um modelo
+EJECT_SECONDS = float(os.getenv("EJECT_SECONDS", "60"))  # Tempo que um modelo ejetado fica fora
+EJECT_ERROR_RATE = float(os.getenv("EJECT_ERROR_RATE", "0.5"))  # Taxa de falhas recentes que também ejeta o modelo (falhas intercaladas)
+EJECT_MIN_SAMPLES = 20  # Requisições recentes necessárias antes de usar a taxa de falhas
+
+
+class ModelStats:
+    """Latências e falhas recentes de um modelo"""
+
+    def __init__(self, window: int = 200):
+        """Inicializa as estatísticas
+
+        Args:
+            window: Número de amostras recentes mantidas
+        """
+        self.latencies = deque(maxlen=window)  # Tempo total das respostas completas (s)
+        self.first_token = deque(maxlen=window)  # Tempo até o primeiro trecho no streaming (s)
+        self.outcomes = deque(maxlen=window)  # True para sucesso, False para falha
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def record_success(self, latency: float, streaming: bool = False):
+        """Registra uma resposta bem-sucedida"""
+        (self.first_token if streaming else self.latencies).append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def record_failure(self):
+        """Registra uma falha e ejeta o modelo se ele falhar demais seguidamente ou na maior parte das vezes"""
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= EJECT_AFTER_FAILURES or (
+            len(self.outcomes) >= EJECT_MIN_SAMPLES and self.error_rate() >= EJECT_ERROR_RATE
+        ):
+            self.ejected_until = time.monotonic() + EJECT_SECONDS
+
+    def percentile(self, p: float, streaming: bool = False) -> Optional[float]:
+        """Percentil p das latências recentes, ou None sem amostras"""
+        samples = sorted(self.first_token if streaming else self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def error_rate(self) -> float:
+        """Fração de falhas entre as requisições recentes"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def available(self) -> bool:
+        """Se o modelo não está ejetado (circuit breaker aberto)"""
+        return time.monotonic() >= self.ejected_until
+
+
+class ModelRouter:
+    """Escolhe o modelo de cada requisição com base na latência e nas falhas observadas
+
+    Se o modelo principal não responde até o seu p95, dispara uma requisição
+    em paralelo (hedge) para o próximo fallback; a primeira resposta vence e
+    a outra é cancelada. Modelos que falham seguidamente, ou em pelo menos
+    EJECT_ERROR_RATE das requisições recentes, são ejetados por
+    EJECT_SECONDS, como um circuit breaker.
+    """
+
+    def __init__(self, client, scheduler=None, fallbacks: Optional[List[str]] = None, min_samples: int = 5):
+        """Inicializa o roteador
+
+        Args:
+            client: OpenRouterClient usado nas chamadas
+            scheduler: LLMScheduler por onde passam todas as chamadas (opcional)
+            fallbacks: IDs de modelos alternativos, em ordem de preferência
+            min_samples: Amostras necessárias antes de usar o p95 como atraso do hedge
+        """
+        self.client = client
+        self.scheduler = scheduler
+        self.fallbacks = FALLBACK_MODELS if fallbacks is None else fallbacks
+        self.min_samples = min_samples
+        self.stats: Dict[str, ModelStats] = {}
+
+    def model_stats(self, model: str) -> ModelStats:
+        """Retorna (criando se necessário) as estatísticas de um modelo"""
+        if model not in self.stats:
+            self.stats[model] = ModelStats()
+        return self.stats[model]
+
+    def candidates(self, primary: str) -> List[str]:
+        """Modelos a tentar, em ordem: o principal e os fallbacks que não estão ejetados
+
+        Args:
+            primary: Modelo configurado no canal
+
+        Returns:
+            Lista com até MAX_ATTEMPTS modelos
+        """
+        order = [primary] + [m for m in self.fallbacks if m != primary]
+        healthy = [m for m in order if self.model_stats(m).available()]
+        # Se todos estiverem ejetados, tenta mesmo assim na ordem original
+        return (healthy or order)[:MAX_ATTEMPTS]
+
+    def hedge_delay(self, model: str, streaming: bool = False) -> float:
+        """Quanto esperar pelo modelo antes de disparar o hedge"""
+        stats = self.model_stats(model)
+        samples = stats.first_token if streaming else stats.latencies
+        if len(samples) < self.min_samples:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, stats.percentile(HEDGE_PERCENTILE, streaming))
+
+    async def _race(self, order: List[str], start: Callable[[str], Awaitable], streaming: bool,
+                    discard: Optional[Callable] = None):
+        """Executa `start(modelo)` com hedge e failover e retorna (modelo, resultado) do primeiro sucesso
+
+        Args:
+            order: Modelos em ordem de preferência
+            start: Corrotina que faz a chamada a um modelo
+            streaming: Se os atrasos devem usar o tempo até o primeiro trecho
+            discard: Chamada com resultados de sucesso que perderam a corrida (para liberar recursos)
+        """
+        pending = {}  # {tarefa: modelo}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            model = order[next_index]
+            next_index += 1
+            pending[asyncio.create_task(start(model))] = model
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                # Com chamadas esperando vaga no agendador, um hedge só aumentaria a fila
+                if next_index < len(order) and not (self.scheduler and self.scheduler.queue_depth()):
+                    timeout = self.hedge_delay(order[next_index - 1], streaming)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"Hedge: {order[next_index - 1]} passou do p{HEDGE_PERCENTILE}, tentando {order[next_index]}")
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = (model, task.result())
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    return winner
+
+                # Todas as tentativas em andamento falharam: passa para o próximo modelo
+                if not pending and next_index < len(order):
+                    launch()
+            raise errors[-1]
+        finally:
+            # Cancela as tentativas perdedoras (ou todas, se quem chamou foi cancelado)
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _within(coro: Awaitable, deadline: Optional[float]):
+        """Espera `coro` até o prazo (em time.monotonic()); se ele passar, cancela e levanta asyncio.TimeoutError"""
+        if deadline is None:
+            return await coro
+        return await asyncio.wait_for(coro, max(0.0, deadline - time.monotonic()))
+
+    async def _timed_complete(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """Chama client.complete registrando latência e falhas do modelo"""
+        response, _ = await self._timed_chat(model, messages)
+        return response
+
+    async def _timed_chat(self, model: str, messages: List[Dict[str, str]]) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Chama client.chat registrando latência e falhas do modelo"""
+        started = time.monotonic()
+        try:
+            result = await self.client.chat(model, messages)
+        except asyncio.CancelledError:
+            raise
+        except OpenRouterRateLimitError:
+            LLM_ERRORS.inc(model=model, kind="rate_limited")
+            raise  # 429 é falta de vaga no provedor, não falha do modelo
+        except Exception:
+            LLM_ERRORS.inc(model=model, kind="error")
+            self.model_stats(model).record_failure()
+            raise
+        latency = time.monotonic() - started
+        self.model_stats(model).record_success(latency)
+        LLM_SECONDS.observe(latency, model=model, mode="complete")
+        return result
+
+    async def measure(self, model: str, messages: List[Dict[str, str]],
+                      key: Hashable = None) -> Tuple[str, Optional[Dict[str, int]], float]:
+        """Chama um único modelo, sem hedge nem fallback (usado pelo /compare)
+
+        A chamada passa pelo agendador e entra nas estatísticas do modelo, que
+        orientam o hedge, o failover e o controle de admissão.
+
+        Args:
+            model: ID do modelo
+            messages: Mensagens da requisição
+            key: Chave de justiça no agendador (normalmente o ID do servidor)
+
+        Returns:
+            Tupla (resposta, campo usage ou None, segundos até a resposta, incluindo a fila)
+        """
+        started = time.monotonic()
+        if self.scheduler is None:
+            response, usage = await self._timed_chat(model, messages)
+        else:
+            response, usage = await self.scheduler.run(key, model, lambda: self._timed_chat(model, messages))
+        return response, usage, time.monotonic() - started
+
+    async def _scheduled_complete(self, model: str, messages: List[Dict[str, str]], key: Hashable) -> str:
+        """Chama _timed_complete através do agendador, se houver"""
+        if self.scheduler is None:
+            return await self._timed_complete(model, messages)
+        return await self.scheduler.run(key, model, lambda: self._timed_complete(model, messages))
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], key: Hashable = None,
+                       deadline: Optional[float] = None, on_model: Optional[Callable[[str], None]] = None) -> str:
+        """Obtém a resposta completa, com hedge e failover entre modelos
+
+        Args:
+            model: Modelo principal (o do canal)
+            messages: Mensagens da requisição
+            key: Chave de justiça no agendador (normalmente o ID do servidor)
+            deadline: Prazo em time.monotonic(); estourado, as chamadas em andamento são canceladas
+            on_model: Chamada com o ID do modelo que respondeu (pode ser um fallback)
+
+        Returns:
+            Conteúdo da primeira resposta bem-sucedida
+        """
+        answered, response = await self._within(self._race(
+            self.candidates(model), lambda m: self._scheduled_complete(m, messages, key), streaming=False
+        ), deadline)
+        if on_model is not None:
+            on_model(answered)
+        return response
+
+    async def _timed_stream(self, model: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Repassa client.stream registrando o tempo até o primeiro trecho e as falhas do modelo"""
+        started = time.monotonic()
+        first = True
+        try:
+            async for delta in self.client.stream(model, messages):
+                if first:
+                    latency = time.monotonic() - started
+                    self.model_stats(model).record_success(latency, streaming=True)
+                    LLM_SECONDS.observe(latency, model=model, mode="first_token")
+                    first = False
+                yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except OpenRouterRateLimitError:
+            LLM_ERRORS.inc(model=model, kind="rate_limited")
+            raise
+        except Exception:
+            LLM_ERRORS.inc(model=model, kind="error")
+            self.model_stats(model).record_failure()
+            raise
+
+    async def _open_stream(self, model: str, messages: List[Dict[str, str]], key: Hashable):
+        """Abre um stream (pelo agendador, se houver) e espera o primeiro trecho"""
+        if self.scheduler is None:
+            stream = self._timed_stream(model, messages)
+        else:
+            stream = self.scheduler.stream(key, model, lambda: self._timed_stream(model, messages))
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = ""
+        except BaseException:
+            await stream.aclose()
+            raise
+        return stream, first
+
+    @staticmethod
+    async def _close_stream(result):
+        stream, _ = result
+        await stream.aclose()
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], key: Hashable = None,
+                     deadline: Optional[float] = None, on_model: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+        """Produz os trechos da resposta, com hedge sobre o tempo até o primeiro trecho
+
+        Args:
+            model: Modelo principal (o do canal)
+            messages: Mensagens da requisição
+            key: Chave de justiça no agendador (normalmente o ID do servidor)
+            deadline: Prazo (em time.monotonic()) para o primeiro trecho; depois dele a resposta não é interrompida
+            on_model: Chamada com o ID do modelo que respondeu, antes do primeiro trecho
+
+        Yields:
+            Trechos de texto do modelo que respondeu primeiro
+        """
+        answered, (stream, first) = await self._within(self._race(
+            self.candidates(model), lambda m: self._open_stream(m, messages, key), streaming=True, discard=self._close_stream
+        ), deadline)
+        if on_model is not None:
+            on_model(answered)
+        try:
+            if first:
+                yield first
+            async for delta in stream:
+                yield delta
+        finally:
+            await stream.aclose()
@@ -0,0 +1,213 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+from openrouter import OpenRouterRateLimitError
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # Chamadas simultâneas ao OpenRouter no total
+LLM_MAX_PER_MODEL = int(os.getenv("LLM_MAX_PER_MODEL", "8"))  # Chamadas simultâneas por modelo
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))  # Novas tentativas após um 429
+BACKOFF_BASE = 1.0  # Espera inicial (s) quando o 429 não traz Retry-After
+BACKOFF_MAX = 30.0  # Espera máxima (s) entre tentativas
+
+
+class LLMScheduler:
+    """Agenda todas as chamadas ao OpenRouter
+
+    Limita a concorrência global e por modelo, respeita o Retry-After dos
+    429 (pausando o modelo para todos, não só para quem recebeu o erro) e
+    atende as filas de cada servidor em rodízio, para que um servidor
+    movimentado não deixe os outros esperando.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_per_model: int = LLM_MAX_PER_MODEL,
+                 per_model: Optional[Dict[str, int]] = None):
+        """Inicializa o agendador
+
+        Args:
+            max_concurrency: Chamadas simultâneas no total
+            max_per_model: Chamadas simultâneas por modelo (padrão)
+            per_model: Limites específicos por ID de modelo
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_model = max_per_model
+        self.per_model = per_model or {}
+        self.in_flight = 0
+        self._in_flight_by_model: Dict[str, int] = {}
+        self._blocked_until: Dict[str, float] = {}  # Modelos pausados por Retry-After
+        self._queues: "OrderedDict[Hashable, deque]" = OrderedDict()  # {servidor: deque[(modelo, future, enfileirado_em)]}
+        self._wait_times = deque(maxlen=500)  # Tempos de espera recentes na fila (s)
+
+    def limit_for(self, model: str) -> int:
+        """Chamadas simultâneas permitidas para um modelo"""
+        return self.per_model.get(model, self.max_per_model)
+
+    def in_flight_for(self, model: str) -> int:
+        """Chamadas a um modelo em andamento"""
+        return self._in_flight_by_model.get(model, 0)
+
+    def blocked_for(self, model: str) -> float:
+        """Segundos que faltam para um modelo pausado por Retry-After voltar a ser chamado"""
+        return max(0.0, self._blocked_until.get(model, 0.0) - time.monotonic())
+
+    def _can_run(self, model: str, now: float) -> bool:
+        """Se há capacidade para mais uma chamada a um modelo"""
+        return (
+            self.in_flight < self.max_concurrency
+            and self.in_flight_for(model) < self.limit_for(model)
+            and self._blocked_until.get(model, 0.0) <= now
+        )
+
+    def _grant(self, model: str):
+        self.in_flight += 1
+        self._in_flight_by_model[model] = self._in_flight_by_model.get(model, 0) + 1
+
+    def _dispatch(self):
+        """Libera os próximos da fila, um servidor de cada vez, enquanto houver capacidade"""
+        now = time.monotonic()
+        granted = True
+        while granted and self._queues:
+            granted = False
+            for key in list(self._queues):
+                queue = self._queues[key]
+                while queue and queue[0][1].done():
+                    queue.popleft()  # Quem desistiu de esperar
+                if not queue:
+                    del self._queues[key]
+                    continue
+                model, future, enqueued_at = queue[0]
+                if not self._can_run(model, now):
+                    continue
+                queue.popleft()
+                self._grant(model)
+                self._wait_times.append(now - enqueued_at)
+                future.set_result(None)
+                # O servidor atendido vai para o fim do rodízio
+                if queue:
+                    self._queues.move_to_end(key)
+                else:
+                    del self._queues[key]
+                granted = True
+                break
+
+    async def acquire(self, key: Hashable, model: str):
+        """Espera uma vaga para chamar um modelo
+
+        Args:
+            key: Chave de justiça da fila (normalmente o ID do servidor)
+            model: ID do modelo
+        """
+        if not self._queues and self._can_run(model, time.monotonic()):
+            self._grant(model)
+            self._wait_times.append(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((model, future, time.monotonic()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(model)  # A vaga chegou junto com o cancelamento
+            raise
+
+    def release(self, model: str):
+        """Devolve a vaga de uma chamada encerrada"""
+        self.in_flight -= 1
+        self._in_flight_by_model[model] -= 1
+        self._dispatch()
+
+    def _backoff(self, model: str, attempt: int, retry_after: Optional[float]) -> float:
+        """Calcula a espera após um 429 e pausa o modelo por esse tempo"""
+        base = retry_after if retry_after is not None else min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        delay = min(BACKOFF_MAX, base) * random.uniform(1.0, 1.5)  # Jitter para não voltarem todos juntos
+        until = time.monotonic() + delay
+        if until > self._blocked_until.get(model, 0.0):
+            self._blocked_until[model] = until
+            asyncio.get_running_loop().call_later(delay, self._dispatch)
+        logging.warning(f"OpenRouter respondeu 429 para {model}; nova tentativa em {delay:.1f}s")
+        return delay
+
+    async def run(self, key: Hashable, model: str, call: Callable[[], Awaitable]):
+        """Executa uma chamada ocupando uma vaga, repetindo após 429
+
+        Args:
+            key: Chave de justiça da fila
+            model: ID do modelo
+            call: Função sem argumentos que faz a chamada
+
+        Returns:
+            Resultado da chamada
+        """
+        attempt = 0
+        while True:
+            await self.acquire(key, model)
+            try:
+                return await call()
+            except OpenRouterRateLimitError as e:
+                if attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = self._backoff(model, attempt, e.retry_after)
+            finally:
+                self.release(model)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, key: Hashable, model: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Consome um stream ocupando uma vaga até o fim, repetindo após 429
+
+        Só repete se o 429 vier antes do primeiro trecho.
+
+        Args:
+            key: Chave de justiça da fila
+            model: ID do modelo
+            open_stream: Função sem argumentos que abre o stream
+        """
+        attempt = 0
+        while True:
+            await self.acquire(key, model)
+            started = False
+            stream = open_stream()
+            try:
+                async for delta in stream:
+                    started = True
+                    yield delta
+                return
+            except OpenRouterRateLimitError as e:
+                if started or attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = self._backoff(model, attempt, e.retry_after)
+            finally:
+                await stream.aclose()
+                self.release(model)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def queue_depth(self) -> int:
+        """Número de chamadas esperando vaga"""
+        return sum(1 for queue in self._queues.values() for _, future, _ in queue if not future.done())
+
+    def queued_for(self, model: str) -> int:
+        """Número de chamadas a um modelo esperando vaga"""
+        return sum(1 for queue in self._queues.values() for m, future, _ in queue if m == model and not future.done())
+
+    def wait_time(self, percentile: float = 50) -> float:
+        """Percentil do tempo de espera recente na fila, em segundos"""
+        if not self._wait_times:
+            return 0.0
+        samples = sorted(self._wait_times)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def snapshot(self) -> dict:
+        """Estado atual do agendador, para métricas e diagnóstico"""
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "wait_p50": self.wait_time(50),
+            "wait_p95": self.wait_time(95),
+            "in_flight_by_model": {m: n for m, n in self._in_flight_by_model.items() if n},
+        }
@@ -0,0 +1,125 @@
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+MAX_MESSAGE_LENGTH = 2000  # Limite do Discord
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))  # Segundos entre edições da mesma resposta
+
+CODE_FENCE = "```"
+CODE_BLOCK_OPENER = "```markdown"  # Bloco usado nas respostas do /code
+FENCE_CLOSER = "\n" + CODE_FENCE
+
+
+def _fence_state(text: str, state: Optional[str]) -> Optional[str]:
+    """Calcula qual bloco de código fica aberto ao fim de um trecho
+
+    Args:
+        text: Trecho de texto
+        state: Abertura do bloco aberto no início do trecho (ex: "```python") ou None
+
+    Returns:
+        Abertura do bloco que continua aberto no fim do trecho, ou None
+    """
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith(CODE_FENCE):
+            state = None if state else stripped
+    return state
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH, code_block: bool = False) -> List[str]:
+    """Divide um texto em mensagens que cabem no limite do Discord
+
+    Quebra preferencialmente em fim de linha e mantém os blocos de código
+    balanceados: um bloco aberto numa mensagem é fechado nela e reaberto
+    (com a mesma linguagem) na seguinte.
+
+    Args:
+        text: Texto completo da resposta
+        limit: Tamanho máximo de cada mensagem
+        code_block: Se a resposta inteira deve ir dentro de um bloco ```markdown (modo /code)
+
+    Returns:
+        Lista de mensagens prontas para envio (vazia se o texto for vazio)
+    """
+    if not text:
+        return []
+
+    pages = []
+    state = CODE_BLOCK_OPENER if code_block else None
+    rest = text
+    while rest:
+        opener = f"{state}\n" if state else ""
+        # Reserva espaço para reabrir e para fechar um bloco nesta mensagem
+        budget = limit - len(opener) - len(FENCE_CLOSER)
+        if len(rest) <= budget:
+            chunk, rest = rest, ""
+        else:
+            cut = rest.rfind("\n", 0, budget)
+            if cut <= 0:
+                cut = budget  # Linha maior que o limite: corta no meio
+            chunk = rest[:cut]
+            rest = rest[cut + 1:] if rest[cut] == "\n" else rest[cut:]
+
+        end_state = state if code_block else _fence_state(chunk, state)
+        pages.append(opener + chunk + (FENCE_CLOSER if end_state else ""))
+        state = end_state
+    return pages
+
+
+class ReplyStreamer:
+    """Mostra uma resposta do modelo enquanto ela é gerada
+
+    A primeira mensagem é enviada assim que chega o primeiro trecho; depois
+    ela é editada no lugar, no máximo uma vez a cada STREAM_EDIT_INTERVAL
+    segundos, para respeitar o rate limit de edições do Discord. Quando o
+    texto passa de MAX_MESSAGE_LENGTH, o excedente segue em novas mensagens.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable], code_block: bool = False, interval: float = STREAM_EDIT_INTERVAL):
+        """Inicializa o streamer
+
+        Args:
+            send: Função que envia uma nova mensagem e retorna o objeto editável (ex: followup.send com wait=True)
+            code_block: Se a resposta deve ir dentro de um bloco de código (modo /code)
+            interval: Intervalo mínimo em segundos entre duas atualizações
+        """
+        self.send = send
+        self.code_block = code_block
+        self.interval = interval
+        self.text = ""  # Texto recebido até agora
+        self.messages = []  # Mensagens já enviadas
+        self._rendered = []  # Conteúdo atual de cada mensagem enviada
+        self._last_flush = 0.0
+
+    async def feed(self, delta: str):
+        """Acrescenta um trecho e atualiza as mensagens se o intervalo já passou
+
+        Args:
+            delta: Novo trecho de texto
+        """
+        self.text += delta
+        if time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        """Sincroniza as mensagens do Discord com o texto recebido até agora"""
+        pages = split_message(self.text, code_block=self.code_block)
+        for i, page in enumerate(pages):
+            if i < len(self.messages):
+                if self._rendered[i] != page:
+                    await self.messages[i].edit(content=page)
+                    self._rendered[i] = page
+            else:
+                self.messages.append(await self.send(page))
+                self._rendered.append(page)
+        self._last_flush = time.monotonic()
+
+    async def finish(self) -> str:
+        """Faz a última atualização e retorna o texto completo
+
+        Returns:
+            Texto completo recebido
+        """
+        await self.flush()
+        return self.text
@@ -0,0 +1,243 @@
+import os
+import time
+import bisect
+import logging
+import functools
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Endpoint HTTP das métricas no formato do Prometheus (desligado se METRICS_PORT não estiver definido)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+# Limites dos buckets dos histogramas de latência (segundos); os abaixo de 1 ms separam as etapas em memória
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Contador monotônico com labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Soma `amount` ao contador"""
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """Valor instantâneo com labels (ex: conexões em uso)"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        """Define o valor atual"""
+        self.values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Distribuição de valores em buckets cumulativos, com labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, list] = {}  # {labels: [contagens por bucket (+Inf no fim), soma, total]}
+
+    def observe(self, value: float, **labels):
+        """Registra uma observação"""
+        key = _label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def _merged(self, labels: Dict[str, object]) -> Optional[list]:
+        """Soma as séries que contêm os labels dados (ex: stage="llm" agrega todos os comandos)"""
+        wanted = set(_label_key(labels))
+        merged = None
+        for key, (counts, total_sum, total) in self.series.items():
+            if not wanted.issubset(key):
+                continue
+            if merged is None:
+                merged = [[0] * len(counts), 0.0, 0]
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total_sum
+            merged[2] += total
+        return merged
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estima o quantil q (0-1) por interpolação linear nos buckets, como o histogram_quantile do Prometheus"""
+        series = self._merged(labels)
+        if series is None or not series[2]:
+            return None
+        counts, _, total = series
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # Acima do maior bucket
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def count(self, **labels) -> int:
+        """Número de observações das séries que contêm os labels dados"""
+        series = self._merged(labels)
+        return series[2] if series else 0
+
+    def label_values(self, label: str) -> List[str]:
+        """Valores distintos de um label entre as séries registradas"""
+        return sorted({v for key in self.series for k, v in key if k == label})
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total_sum, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {total}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total_sum}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {total}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas do processo"""
+
+    def __init__(self):
+        self.metrics: List = []
+        self._collectors: List[Callable[[], None]] = []  # Atualizam gauges logo antes da leitura
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._add(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._add(Gauge(name, description))
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, description, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]):
+        """Registra uma função chamada antes de cada leitura (para gauges calculados na hora)"""
+        self._collectors.append(collector)
+
+    def collect(self):
+        """Executa os coletores registrados"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Erro ao coletar métricas: {str(e)}")
+
+    def render(self) -> str:
+        """Todas as métricas no formato de texto do Prometheus"""
+        self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("kurama_stage_seconds", "Duração de cada etapa do processamento de um comando")
+COMMAND_SECONDS = registry.histogram("kurama_command_seconds", "Duração total de um comando, do recebimento à resposta")
+DB_SECONDS = registry.histogram("kurama_db_seconds", "Duração das operações do Database, incluindo a espera por conexão")
+LLM_SECONDS = registry.histogram("kurama_llm_seconds", "Latência das chamadas ao OpenRouter (resposta completa ou primeiro trecho)")
+LLM_ERRORS = registry.counter("kurama_llm_errors_total", "Chamadas ao OpenRouter que falharam")
+LLM_TOKENS = registry.counter("kurama_llm_tokens_total", "Tokens informados no campo usage do OpenRouter")
+DB_POOL = registry.gauge("kurama_db_pool_connections", "Conexões do pool do Postgres")
+SCHEDULER = registry.gauge("kurama_llm_scheduler", "Estado do agendador de chamadas ao OpenRouter")
+ADMISSION = registry.counter("kurama_admission_total", "Decisões do controle de admissão de perguntas")
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Mede a duração de uma etapa em kurama_stage_seconds
+
+    Uso: `with span("llm", command="ask"): ...` (funciona em código async)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, **labels)
+
+
+def timed_db(func):
+    """Decorador que mede um método async do Database em kurama_db_seconds"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, method=func.__name__)
+    return wrapper
+
+
+def record_usage(model: str, usage: Optional[dict]):
+    """Registra os tokens do campo `usage` de uma resposta do OpenRouter"""
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], model=model, kind=kind.split("_")[0])
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: Optional[int] = METRICS_PORT):
+    """Serve GET /metrics no formato do Prometheus
+
+    Returns:
+        O AppRunner do servidor (para fechar no desligamento), ou None se desligado
+    """
+    if port is None:
+        return None
+    from aiohttp import web
+
+    async def handle(_request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+    return runner